@@ -0,0 +1,58 @@
+import os
+import json
+
+# --- CONFIG ---
+MYSQL_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_mysql_schema.json"
+PG_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_pg_schema.json"
+ALWAYS_FIELDS = ("id", "date_modified")   # keys and the high-water column are always requested
+ID_BATCH = 100                            # ids per _filters=id(...) request; matches the page limit
+
+_schemas = {}
+_plans = {}
+
+
+# --- SCHEMA ---
+def load_schema_columns(path):
+    """{table: [column, ...]} from an exported schema JSON, reloaded when the file changes."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _schemas.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="utf-8") as f:
+            schema = {k.lower(): [c["name"] for c in v] for k, v in json.load(f).items()}
+        cached = _schemas[path] = (mtime, schema)
+    return cached[1]
+
+
+# --- PLANNER ---
+def plan_fields(table):
+    """The minimal _fields list for a resource: the columns its mirror table stores.
+
+    Columns come from accelo_mysql_schema.json, falling back to accelo_pg_schema.json
+    for tables only PostgreSQL knows. Returns None when neither schema has the table,
+    in which case callers should ask for everything.
+    """
+    key = table.lower()
+    mysql_columns = load_schema_columns(MYSQL_SCHEMA_PATH).get(key)
+    columns = mysql_columns if mysql_columns is not None else load_schema_columns(PG_SCHEMA_PATH).get(key)
+    if columns is None:
+        return None
+    plan = _plans.get((key, tuple(columns)))
+    if plan is None:
+        plan = list(ALWAYS_FIELDS) + [c for c in columns if c not in ALWAYS_FIELDS]
+        _plans[(key, tuple(columns))] = plan
+    return plan
+
+
+def fields_param(table):
+    """Value for the `_fields` query parameter of a resource backed by `table`."""
+    plan = plan_fields(table)
+    return ",".join(plan) if plan else "_ALL"
+
+
+def id_filters(ids, batch=ID_BATCH):
+    """Split ids into `_filters=id(...)` values of at most `batch` ids each."""
+    ids = sorted({str(i) for i in ids}, key=lambda i: (len(i), i))
+    return [f"id({','.join(ids[i:i + batch])})" for i in range(0, len(ids), batch)]
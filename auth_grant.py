@@ -2,6 +2,7 @@ import os
 import requests
 import logging
 from dotenv import load_dotenv
+from token_manager import get_manager
 
 # Setup logging
 logging.basicConfig(
@@ -22,7 +23,7 @@ SCOPE = os.getenv("ACCELO_SCOPE", "read(all)")
 # Token endpoint for service app
 TOKEN_URL = f"https://{DEPLOYMENT}/oauth2/v0/token"
 
-def get_service_token():
+def fetch_service_token():
     response = requests.post(TOKEN_URL, data={
         "grant_type": "client_credentials",
         "client_id": CLIENT_ID,
@@ -36,7 +37,11 @@ def get_service_token():
 
     token_data = response.json()
     logging.info("Service token successfully retrieved.")
-    return token_data["access_token"]
+    return token_data["access_token"], token_data.get("expires_in", 3600)
+
+def get_service_token(force_refresh=False):
+    """Cached Accelo service token; a new one is only requested shortly before expiry."""
+    return get_manager(f"accelo:{DEPLOYMENT}:{CLIENT_ID}:{SCOPE}", fetch_service_token).get(force_refresh)
 
 def validate_token(token):
     """Optional connectivity check, not required for production flow."""
@@ -0,0 +1,243 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- CONFIG ---
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "4"))
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "4"))
+POOL_TIMEOUT = 60          # seconds to wait for a free connection before giving up
+HEALTH_CHECK_AFTER = 30    # ping connections that sat idle longer than this
+STREAM_ITERSIZE = 10000    # rows per round trip for server-side cursors
+
+# Session setup for bulk loads: a crash can lose the last few commits, never corrupt data.
+PG_BULK_SETUP = ("SET synchronous_commit = off",)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+# --- DRIVERS ---
+def connect_pg():
+    import psycopg2
+    return psycopg2.connect(
+        dbname=os.getenv("DBNAME"),
+        user=os.getenv("DBUSER"),
+        password=os.getenv("DBPASSWORD"),
+        host=os.getenv("DBHOST"),
+        port=os.getenv("DBPORT")
+    )
+
+
+def connect_mysql():
+    import mysql.connector
+    return mysql.connector.connect(
+        host=os.getenv("MYSQL_HOST"),
+        port=os.getenv("MYSQL_PORT"),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=os.getenv("MYSQL_DATABASE")
+    )
+
+
+def ping_pg(conn):
+    if conn.closed:
+        return False
+    conn.rollback()   # a healthy connection left in an aborted transaction would fail SELECT 1
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    finally:
+        cursor.close()
+    conn.rollback()
+    return True
+
+
+def ping_mysql(conn):
+    return conn.is_connected()
+
+
+# --- POOL ---
+class ConnectionPool:
+    """Bounded, thread-safe pool of connections made by `connect()`.
+
+    At most `size` connections are checked out at once; callers beyond that wait up
+    to POOL_TIMEOUT seconds. `setup` statements run once on each new connection.
+    Connections idle longer than HEALTH_CHECK_AFTER are pinged before reuse and
+    replaced if they have gone away.
+    """
+
+    def __init__(self, connect, ping, size, setup=()):
+        self.connect = connect
+        self.ping = ping
+        self.size = size
+        self.setup = tuple(setup)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _new_connection(self):
+        conn = self.connect()
+        if self.setup:
+            cursor = conn.cursor()
+            for statement in self.setup:
+                cursor.execute(statement)
+            cursor.close()
+            conn.commit()
+        return conn
+
+    def _healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < HEALTH_CHECK_AFTER:
+            return True
+        try:
+            return self.ping(conn)
+        except Exception:
+            return False
+
+    def acquire(self, timeout=POOL_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeout(f"No free connection after {timeout}s (pool size {self.size})")
+        try:
+            while True:
+                try:
+                    conn, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._new_connection()
+                if self._healthy(conn, idle_since):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        try:
+            if not discard:
+                try:
+                    conn.rollback()   # never hand out a connection mid-transaction
+                except Exception:
+                    discard = True
+            if discard:
+                self._discard(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the block; it is rolled back and returned afterwards."""
+        conn = self.acquire()
+        ok = False
+        try:
+            yield conn
+            ok = True
+        finally:
+            self.release(conn, discard=not ok and not self._healthy(conn, 0))
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+class PooledConnection:
+    """A checked-out connection whose close() hands it back to the pool.
+
+    Lets callers written against plain connections (conn = get_pg_connection() ...
+    conn.close()) reuse pooled connections unchanged.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise AttributeError(f"{name}: connection was already returned to the pool")
+        return getattr(conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def get_pool(kind, setup=()):
+    """Process-wide pool for "pg" or "mysql" with the given session setup statements."""
+    key = (kind, tuple(setup), os.getpid())   # pools are never shared across a fork
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if kind == "pg":
+                pool = ConnectionPool(connect_pg, ping_pg, PG_POOL_SIZE, setup)
+            else:
+                pool = ConnectionPool(connect_mysql, ping_mysql, MYSQL_POOL_SIZE, setup)
+            _pools[key] = pool
+        return pool
+
+
+# --- FACTORIES ---
+def get_pg_connection(setup=()):
+    """Pooled PostgreSQL connection; close() returns it to the pool."""
+    pool = get_pool("pg", setup)
+    return PooledConnection(pool, pool.acquire())
+
+
+def get_mysql_connection(setup=()):
+    pool = get_pool("mysql", setup)
+    return PooledConnection(pool, pool.acquire())
+
+
+def pg_connection(setup=()):
+    """`with pg_connection() as conn:` checkout from the PostgreSQL pool."""
+    return get_pool("pg", setup).connection()
+
+
+def mysql_connection(setup=()):
+    return get_pool("mysql", setup).connection()
+
+
+# --- STREAMING READS ---
+def iter_pg_rows(query, params=None, itersize=STREAM_ITERSIZE, setup=()):
+    """Yield rows of a large query through a named (server-side) cursor, itersize rows per fetch."""
+    with pg_connection(setup) as conn:
+        cursor = conn.cursor(name=f"stream_{threading.get_ident()}_{time.monotonic_ns()}")
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, params)
+            yield from cursor
+        finally:
+            cursor.close()
+
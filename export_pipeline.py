@@ -0,0 +1,245 @@
+import os
+import time
+import queue
+import struct
+import zipfile
+import threading
+import requests
+from sql_watchdog import (
+    SAVE_FOLDER, probe_download, fetch_range, verify_download, download_sql,
+    load_part_state, save_part_state,
+)
+from import_sql_dump import IMPORT_WORKERS, import_zip_member, import_sql_from_zip
+from main_helper import import_with_retries
+from sync_tables.fingerprint_store import FingerprintStore
+
+TAIL_BYTES = 4 << 20   # enough for the central directory of a few thousand members
+_DONE = None           # end-of-work marker on the import queue
+
+_EOCD = struct.Struct("<4s4H2LH")        # End of Central Directory record
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+
+
+# --- HELPERS ---
+def read_at(path, offset, size):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def locate_central_directory(part_path, tail_start, total):
+    """(offset, size) of the central directory, parsed from the EOCD record in the fetched tail.
+
+    Handles ZIP64 archives, whose EOCD points at a ZIP64 record for the real values.
+    Raises zipfile.BadZipFile when the tail holds no EOCD record.
+    """
+    tail = read_at(part_path, tail_start, total - tail_start)
+    pos = tail.rfind(b"PK\x05\x06")
+    if pos < 0 or pos + _EOCD.size > len(tail):
+        raise zipfile.BadZipFile("End of central directory record not found in the downloaded tail")
+    _, _, _, _, _, cd_size, cd_offset, _ = _EOCD.unpack_from(tail, pos)
+    if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+        loc = pos - _ZIP64_LOCATOR.size
+        if loc < 0 or tail[loc:loc + 4] != b"PK\x06\x07":
+            raise zipfile.BadZipFile("ZIP64 locator not found in the downloaded tail")
+        _, _, zip64_offset, _ = _ZIP64_LOCATOR.unpack_from(tail, loc)
+        record = read_at(part_path, zip64_offset, _ZIP64_EOCD.size) if zip64_offset < tail_start \
+            else tail[zip64_offset - tail_start:zip64_offset - tail_start + _ZIP64_EOCD.size]
+        if record[:4] != b"PK\x06\x06":
+            raise zipfile.BadZipFile("ZIP64 end of central directory record not found")
+        *_, cd_size, cd_offset = _ZIP64_EOCD.unpack(record)
+    return cd_offset, cd_size
+
+
+def read_central_directory(session, url, part_path, total):
+    """Fetch the end of the zip and return (sql_members, central_directory_offset, tail_start).
+
+    The EOCD record is parsed from the fetched tail first; if the central directory
+    starts before the tail, the missing part is fetched too. Only then is the
+    preallocated .part file opened with ZipFile, whose body is still missing.
+    """
+    tail_start = max(0, total - TAIL_BYTES)
+    fetch_range(session, url, part_path, [tail_start, total - 1], lambda n: None)
+    cd_offset, _ = locate_central_directory(part_path, tail_start, total)
+    if cd_offset < tail_start:
+        fetch_range(session, url, part_path, [cd_offset, tail_start - 1], lambda n: None)
+        tail_start = cd_offset
+    with zipfile.ZipFile(part_path) as zf:
+        infos = zf.infolist()
+
+    members = []
+    ordered = sorted(infos, key=lambda i: i.header_offset)
+    for i, info in enumerate(ordered):
+        end = ordered[i + 1].header_offset if i + 1 < len(ordered) else cd_offset
+        if not info.is_dir() and info.filename.lower().endswith(".sql"):
+            members.append((info.filename, end))
+    return members, cd_offset, tail_start
+
+
+def import_worker(part_path, ready, results):
+    while True:
+        item = ready.get()
+        if item is _DONE:
+            return
+        member, previous = item
+        try:
+            result = import_zip_member(part_path, member, previous, verify=True)
+        except Exception as e:
+            result = {"file": os.path.basename(member), "ok": False, "seconds": 0.0, "bytes": 0,
+                      "bytes_per_sec": 0.0, "error": str(e), "fingerprint": None}
+        results.put(result)
+
+
+def collect_result(result, summary, store):
+    name = result["file"]
+    if result.get("skipped"):
+        summary["skipped"].append(name)
+        return
+    summary["stats"][name] = result
+    if result["ok"]:
+        store.record(name, result["fingerprint"])
+        summary["imported"].append(name)
+        mb = result["bytes"] / (1024 * 1024)
+        print(f"  → {name}: done, {mb:.1f} MB in {result['seconds']:.1f}s")
+    else:
+        summary["ok"] = False
+        summary["failed"].append(name)
+        print(f"  → {name}: failed:\n{result['error']}")
+
+
+# --- PIPELINE ---
+def pipelined_download_import(link, dump_dir=SAVE_FOLDER, workers=IMPORT_WORKERS, incremental=True):
+    """Download the export zip and import its members into MySQL while it is still arriving.
+
+    The zip's central directory is fetched first, then the body is downloaded front to
+    back; each .sql member is queued for import as soon as its last byte is on disk.
+    The .part file is assembled from ranged fetches, so an import session checks each
+    member against its central-directory CRC32 before sending it to mysql; a mismatch
+    fails only that member, which run_pipelined_import() retries from the finished zip.
+    A bounded queue sits between the download and the `workers` import sessions, so the
+    download never waits on MySQL and at most `workers` members are queued ahead.
+    Returns (zip_path, summary) where summary matches import_sql_from_zip().
+    """
+    os.makedirs(dump_dir, exist_ok=True)
+    session = requests.Session()
+    url, total, fname, etag, ranged = probe_download(session, link)
+    path = os.path.join(dump_dir, fname)
+
+    if not ranged or not total:
+        print("Server does not support range requests; downloading before import.")
+        path = download_sql(link, dump_dir)
+        return path, import_sql_from_zip(path, incremental, workers)
+
+    part_path = path + ".part"
+    state_path = part_path + ".json"
+    started = time.perf_counter()
+
+    ranges = load_part_state(state_path, total, etag) if os.path.exists(part_path) else None
+    if ranges is None or len(ranges) != 1:
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+        ranges = None
+    members, cd_offset, tail_start = read_central_directory(session, url, part_path, total)
+    body = ranges[0] if ranges else [0, tail_start - 1]
+    save_part_state(state_path, total, etag, [body])
+    print(f"[+] {fname}: {len(members)} SQL members, {total / (1024 * 1024):.1f} MB. Pipelined import with {workers} sessions...")
+
+    progress = threading.Condition()
+    failure = []
+
+    def downloaded_upto():
+        return total if body[0] > body[1] else body[0]
+
+    def on_chunk(n):
+        with progress:
+            progress.notify_all()
+
+    def download():
+        try:
+            fetch_range(session, url, part_path, body, on_chunk)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            save_part_state(state_path, total, etag, [body])
+            with progress:
+                progress.notify_all()
+
+    store = FingerprintStore("mysql")
+    ready = queue.Queue(maxsize=workers)
+    results = queue.Queue()
+    summary = {"ok": True, "imported": [], "skipped": [], "failed": [], "stats": {}}
+
+    downloader = threading.Thread(target=download, daemon=True)
+    importers = [threading.Thread(target=import_worker, args=(part_path, ready, results), daemon=True)
+                 for _ in range(workers)]
+    downloader.start()
+    for t in importers:
+        t.start()
+
+    queued = 0
+    for member, end in members:
+        with progress:
+            while end > downloaded_upto() and not failure and downloader.is_alive():
+                progress.wait(1)
+        if end > downloaded_upto():
+            break
+        previous = store.get(os.path.basename(member)) if incremental else None
+        ready.put((member, previous))
+        queued += 1
+        while not results.empty():
+            collect_result(results.get(), summary, store)
+
+    for _ in importers:
+        ready.put(_DONE)
+    for t in importers:
+        t.join()
+    downloader.join()
+    while not results.empty():
+        collect_result(results.get(), summary, store)
+    store.close()
+
+    if failure or queued < len(members):
+        raise RuntimeError(f"Download stopped at byte {body[0]} of {total}: {failure[0] if failure else 'incomplete'}")
+
+    verify_download(part_path, total, etag)
+    os.replace(part_path, path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+    print(f"[+] Imported {len(summary['imported'])}, skipped {len(summary['skipped'])}, "
+          f"failed {len(summary['failed'])} in {time.perf_counter() - started:.1f}s (download included)")
+    return path, summary
+
+
+def run_pipelined_import(link, max_retries=12, wait_seconds=300):
+    """pipelined_download_import(), then retry failed members from the finished zip and delete it.
+
+    If the pipelined download breaks off, the rest of the zip is fetched by the ranged
+    downloader (resuming from the .part file) and the members not yet imported are
+    imported from it.
+    """
+    print("Starting pipelined download and SQL insert...")
+    try:
+        path, summary = pipelined_download_import(link)
+    except RuntimeError as e:
+        print(f"Pipelined download stopped ({e}); resuming the download...")
+        try:
+            path = download_sql(link)
+        except (RuntimeError, requests.RequestException, OSError) as e:
+            print(f"Download failed: {e}")
+            return False
+        summary = import_sql_from_zip(path)
+    if not summary["ok"]:
+        retry = lambda only: import_sql_from_zip(path, only=only)
+        if not import_with_retries(retry, max_retries, wait_seconds, pending=summary["failed"]):
+            return False
+    else:
+        print("SQL insert completed successfully.")
+
+    try:
+        os.remove(path)
+        print(f"Deleted ZIP: {path}")
+    except Exception as e:
+        print(f"Cleanup failed: {e}")
+    return True
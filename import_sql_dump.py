@@ -1,37 +1,209 @@
 import os
 import glob
+import time
+import zipfile
+import tempfile
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from sync_tables.fingerprint_store import FingerprintStore, FingerprintReader, fingerprint_file, zip_member_key
 
 load_dotenv()
 DBUSER = os.getenv("MYSQL_USER")
 DBPASS = os.getenv("MYSQL_PASSWORD")
 DBNAME = os.getenv("MYSQL_DATABASE")
+IMPORT_WORKERS = int(os.getenv("MYSQL_IMPORT_WORKERS", "4"))
+MAX_ALLOWED_PACKET = "1G"
+# Per-session load settings; the dump recreates every table, so the checks only cost time.
+SESSION_INIT = "SET SESSION unique_checks=0; SET SESSION foreign_key_checks=0"
+PIPE_CHUNK = 1 << 20
 
-def import_sql_from_folder(folder_path):
-    sql_files = sorted(glob.glob(os.path.join(folder_path, "*.sql")))
-    if not sql_files:
-        print("[!] No SQL files found to import.")
-        return False
+def mysql_command():
+    return [
+        "mysql", f"-u{DBUSER}", f"-p{DBPASS}",
+        f"--max_allowed_packet={MAX_ALLOWED_PACKET}",
+        f"--init-command={SESSION_INIT}",
+        DBNAME,
+    ]
 
-    total = len(sql_files)
-    print(f"[+] Found {total} SQL files. Starting import...")
+def import_sql_stream(name, stream):
+    """Pipe one SQL stream into its own mysql session; returns a per-file result dict.
 
-    for i, file_path in enumerate(sql_files, 1):
-        print(f"  → Importing {os.path.basename(file_path)} ({i}/{total})... ", end="")
+    If reading the stream fails part-way (a corrupt zip member, a dropped network
+    share) mysql is killed rather than left to see EOF and commit a partial import.
+    """
+    started = time.perf_counter()
+    sent = 0
+    with tempfile.TemporaryFile() as err:
         try:
-            result = subprocess.run(
-                ["mysql", f"-u{DBUSER}", f"-p{DBPASS}", DBNAME, "-e", f"source {file_path}"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                shell=False
-            )
-            if result.returncode == 0:
-                print("Done")
-            else:
-                print(f"Failed:\n{result.stderr}")
+            proc = subprocess.Popen(mysql_command(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                    stderr=err, shell=False)
+            pumped = False
+            try:
+                while True:
+                    block = stream.read(PIPE_CHUNK)
+                    if not block:
+                        break
+                    proc.stdin.write(block)
+                    sent += len(block)
+                proc.stdin.close()
+                pumped = True
+            except BrokenPipeError:
+                pumped = True  # mysql exited early; its stderr says why
+            finally:
+                if not pumped:
+                    proc.kill()
+                    proc.wait()
+            returncode = proc.wait()
+            err.seek(0)
+            error = err.read().decode("utf-8", errors="ignore").strip()
         except Exception as e:
-            print(f"Exception: {e}")
+            returncode, error = -1, str(e)
+
+    seconds = time.perf_counter() - started
+    return {
+        "file": name,
+        "ok": returncode == 0,
+        "seconds": seconds,
+        "bytes": sent,
+        "bytes_per_sec": sent / seconds if seconds else 0.0,
+        "error": error if returncode != 0 else "",
+    }
+
+def import_sql_file(file_path, fingerprint=None):
+    with open(file_path, "rb") as f:
+        result = import_sql_stream(os.path.basename(file_path), f)
+    result["fingerprint"] = fingerprint
+    return result
+
+def check_member_crc(zf, info):
+    """Inflate a member and discard it; zipfile raises BadZipFile if its CRC32 does not match."""
+    with zf.open(info) as raw:
+        while raw.read(PIPE_CHUNK):
+            pass
+
+def import_zip_member(zip_path, member, previous=None, verify=False):
+    """Stream one .sql member straight out of the zip into mysql, without extracting it.
+
+    Each call opens its own ZipFile handle so members decompress in parallel. A member
+    whose CRC32 and size match `previous` is skipped without being decompressed; any
+    other member is decompressed once, hashed while it is piped to mysql, and recorded
+    as "<zip key>/<content fingerprint>". With `verify` the member's CRC32 is checked
+    in a separate pass first, so a corrupt member never reaches mysql (whose
+    statements autocommit as they arrive).
+    """
+    name = os.path.basename(member)
+    with zipfile.ZipFile(zip_path) as zf:
+        info = zf.getinfo(member)
+        key = zip_member_key(info)
+        if previous and previous.startswith(key + "/"):
+            return {"file": name, "ok": True, "skipped": True, "fingerprint": previous}
+        if verify:
+            check_member_crc(zf, info)
+        with zf.open(info) as raw:
+            stream = FingerprintReader(raw)
+            result = import_sql_stream(name, stream)
+    result["fingerprint"] = f"{key}/{stream.hexdigest()}"
+    return result
+
+def run_imports(jobs, workers, store):
+    """Run (name, fn) import jobs concurrently; returns the summary for import_sql_* callers."""
+    summary = {"ok": True, "imported": [], "skipped": [], "failed": [], "stats": {}}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fn): name for name, fn in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"file": name, "ok": False, "seconds": 0.0, "bytes": 0, "bytes_per_sec": 0.0,
+                          "error": str(e), "fingerprint": None}
+            if result.get("skipped"):
+                summary["skipped"].append(name)
+                continue
+            summary["stats"][name] = result
+            mb = result["bytes"] / (1024 * 1024)
+            rate = result["bytes_per_sec"] / (1024 * 1024)
+            if result["ok"]:
+                store.record(name, result["fingerprint"])
+                summary["imported"].append(name)
+                print(f"  → {name} ({done}/{len(futures)}): done, {mb:.1f} MB in {result['seconds']:.1f}s ({rate:.1f} MB/s)")
+            else:
+                summary["ok"] = False
+                summary["failed"].append(name)
+                print(f"  → {name} ({done}/{len(futures)}): failed:\n{result['error']}")
+    return summary
+
+def import_sql_from_folder(folder_path, incremental=True, workers=IMPORT_WORKERS, only=None):
+    """Import the .sql files in folder_path into MySQL over `workers` parallel sessions.
+
+    With `incremental`, files whose content fingerprint matches the last successful
+    import are skipped. `only` restricts the run to the given file names (e.g. the
+    "failed" list of a previous run). Returns a summary dict with "ok", "imported",
+    "skipped", "failed" and per-file "stats" (seconds, bytes, bytes_per_sec, error).
+    """
+    sql_files = sorted(glob.glob(os.path.join(folder_path, "*.sql")))
+    if only is not None:
+        wanted = set(only)
+        sql_files = [f for f in sql_files if os.path.basename(f) in wanted]
+    if not sql_files and only is None:
+        print("[!] No SQL files found to import.")
+        return {"ok": False, "imported": [], "skipped": [], "failed": [], "stats": {}}
+
+    print(f"[+] Found {len(sql_files)} SQL files. Starting import with {workers} sessions...")
+    store = FingerprintStore("mysql")
+    jobs = []
+    skipped = []
+    for file_path in sorted(sql_files, key=os.path.getsize, reverse=True):
+        name = os.path.basename(file_path)
+        fingerprint = fingerprint_file(file_path)
+        if incremental and store.is_unchanged(name, fingerprint):
+            skipped.append(name)
+            continue
+        jobs.append((name, lambda path=file_path, fp=fingerprint: import_sql_file(path, fp)))
+    if skipped:
+        print(f"[+] Skipping {len(skipped)} files unchanged since last import.")
+
+    started = time.perf_counter()
+    summary = run_imports(jobs, workers, store)
+    summary["skipped"] += skipped
+    store.close()
+
+    print(f"[+] Imported {len(summary['imported'])}, skipped {len(skipped)}, failed {len(summary['failed'])} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return summary
+
+def import_sql_from_zip(zip_path, incremental=True, workers=IMPORT_WORKERS, only=None):
+    """Import every .sql member of an export zip into MySQL without extracting it to disk.
+
+    Same arguments and summary as import_sql_from_folder(); file names are member
+    base names.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            members = [i for i in zf.infolist() if not i.is_dir() and i.filename.lower().endswith(".sql")]
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"[!] Cannot read {zip_path}: {e}")
+        return {"ok": False, "imported": [], "skipped": [], "failed": [], "stats": {}}
+    if only is not None:
+        wanted = set(only)
+        members = [i for i in members if os.path.basename(i.filename) in wanted]
+    if not members and only is None:
+        print("[!] No SQL files found in the zip.")
+        return {"ok": False, "imported": [], "skipped": [], "failed": [], "stats": {}}
+
+    print(f"[+] Found {len(members)} SQL members. Streaming import with {workers} sessions...")
+    store = FingerprintStore("mysql")
+    jobs = []
+    for info in sorted(members, key=lambda i: i.file_size, reverse=True):
+        name = os.path.basename(info.filename)
+        previous = store.get(name) if incremental else None
+        jobs.append((name, lambda member=info.filename, prev=previous: import_zip_member(zip_path, member, prev)))
+
+    started = time.perf_counter()
+    summary = run_imports(jobs, workers, store)
+    store.close()
 
-    return True
+    print(f"[+] Imported {len(summary['imported'])}, skipped {len(summary['skipped'])}, "
+          f"failed {len(summary['failed'])} in {time.perf_counter() - started:.1f}s")
+    return summary
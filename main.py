@@ -1,18 +1,26 @@
-import time
 import argparse
 from accelo_scraper import login_and_save_cookies
-from main_helper import trigger_sql_export, unzip_latest_sql, run_clean_up
-from sql_watchdog import run_watchdog
+from main_helper import trigger_sql_export, unzip_latest_sql, run_clean_up, run_zip_import
+from sql_watchdog import watch_for_export, download_sql, delete_email
+from export_pipeline import run_pipelined_import
 
-INTERVAL = 300
+def wait_for_sql_and_extract(stream=False):
+    token, msg_id, link = watch_for_export()
+    download_sql(link)
+    delete_email(token, msg_id)
+    print("Watchdog success: SQL export downloaded and email deleted.")
+    extract_and_import(stream)
 
-def wait_for_sql_and_extract():
-    success = False
-    while not success:
-        success = run_watchdog()
-        if not success:
-            time.sleep(INTERVAL)
-    if success:
+def wait_for_sql_and_pipeline():
+    """Import the export while it downloads instead of download, unzip, import in turn."""
+    token, msg_id, link = watch_for_export()
+    if run_pipelined_import(link):
+        delete_email(token, msg_id)
+
+def extract_and_import(stream=False):
+    if stream:
+        run_zip_import()
+    else:
         unzip_latest_sql()
         run_clean_up()
 
@@ -22,19 +30,26 @@ def main():
     parser.add_argument("--email_side", action="store_true", help="Start from email side")
     parser.add_argument("--unzip", action="store_true", help="Unzip latest SQL export")
     parser.add_argument("--cleanup", action="store_true", help="Run cleanup and SQL insert")
+    parser.add_argument("--stream", action="store_true", help="Import straight from the zip instead of extracting it")
+    parser.add_argument("--pipeline", action="store_true", help="Import members while the export is still downloading")
     args = parser.parse_args()
 
     if args.sql_dump:
         login_and_save_cookies()
         trigger_sql_export()
-        wait_for_sql_and_extract()
+        if args.pipeline:
+            wait_for_sql_and_pipeline()
+        else:
+            wait_for_sql_and_extract(args.stream)
     
     elif args.email_side:
-        wait_for_sql_and_extract()
+        if args.pipeline:
+            wait_for_sql_and_pipeline()
+        else:
+            wait_for_sql_and_extract(args.stream)
         
     elif args.unzip:
-        unzip_latest_sql()
-        run_clean_up()
+        extract_and_import(args.stream)
         
     elif args.cleanup:
         run_clean_up()
@@ -5,7 +5,7 @@ import zipfile
 import subprocess
 from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright
-from import_sql_dump import import_sql_from_folder
+from import_sql_dump import import_sql_from_folder, import_sql_from_zip
 
 
 load_dotenv()
@@ -79,37 +79,66 @@ def unzip_latest_sql():
         return None
 
 
-def run_clean_up(max_retries=12, wait_seconds=300):
-    extract_path = os.path.splitext(ZIP_PATH)[0]
+def import_with_retries(import_fn, max_retries=12, wait_seconds=300, pending=None):
+    """Call import_fn(only=...) until it succeeds, retrying only the files that failed.
 
-    print("Starting cleanup and SQL insert...")
+    `pending` None imports everything first; a list starts with just those files.
+    """
     retries = 0
 
     while retries < max_retries:
-        success = import_sql_from_folder(extract_path)
-        if success:
+        result = import_fn(only=pending)
+        if result["ok"]:
             print("SQL insert completed successfully.")
-            # proceed with cleanup
-            try:
-                os.remove(ZIP_PATH)
-                print(f"Deleted ZIP: {ZIP_PATH}")
-                if os.path.exists(extract_path):
-                    for root, dirs, files in os.walk(extract_path, topdown=False):
-                        for name in files:
-                            os.remove(os.path.join(root, name))
-                        for name in dirs:
-                            os.rmdir(os.path.join(root, name))
-                    os.rmdir(extract_path)
-                    print(f"Deleted extracted folder: {extract_path}")
-            except Exception as e:
-                print(f"Cleanup failed: {e}")
             return True
-        else:
-            print(f"Insert failed (attempt {retries + 1}/{max_retries}). Retrying in {wait_seconds} sec...")
-            retries += 1
-            time.sleep(wait_seconds)
+        if result["failed"]:
+            pending = result["failed"]
+            print(f"Failed files: {', '.join(pending)}")
+        print(f"Insert failed (attempt {retries + 1}/{max_retries}). Retrying in {wait_seconds} sec...")
+        retries += 1
+        time.sleep(wait_seconds)
 
     print("Max retries exceeded. Manual cleanup may be required.")
     return False
-        
-    
\ No newline at end of file
+
+
+def run_clean_up(max_retries=12, wait_seconds=300):
+    extract_path = os.path.splitext(ZIP_PATH)[0]
+
+    print("Starting cleanup and SQL insert...")
+    if not import_with_retries(lambda only: import_sql_from_folder(extract_path, only=only), max_retries, wait_seconds):
+        return False
+
+    # proceed with cleanup
+    try:
+        os.remove(ZIP_PATH)
+        print(f"Deleted ZIP: {ZIP_PATH}")
+        if os.path.exists(extract_path):
+            for root, dirs, files in os.walk(extract_path, topdown=False):
+                for name in files:
+                    os.remove(os.path.join(root, name))
+                for name in dirs:
+                    os.rmdir(os.path.join(root, name))
+            os.rmdir(extract_path)
+            print(f"Deleted extracted folder: {extract_path}")
+    except Exception as e:
+        print(f"Cleanup failed: {e}")
+    return True
+
+
+def run_zip_import(max_retries=12, wait_seconds=300):
+    """Import straight from accelo_download.zip (no extraction), then delete the zip."""
+    if not os.path.exists(ZIP_PATH):
+        print(f"[!] File not found: {ZIP_PATH}")
+        return False
+
+    print("Starting streaming SQL insert from zip...")
+    if not import_with_retries(lambda only: import_sql_from_zip(ZIP_PATH, only=only), max_retries, wait_seconds):
+        return False
+
+    try:
+        os.remove(ZIP_PATH)
+        print(f"Deleted ZIP: {ZIP_PATH}")
+    except Exception as e:
+        print(f"Cleanup failed: {e}")
+    return True
@@ -1,15 +1,2 @@
 # mysql_conn.py
-import mysql.connector
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-def get_mysql_connection():
-    return mysql.connector.connect(
-        host=os.getenv("MYSQL_HOST"),
-        port=os.getenv("MYSQL_PORT"),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        database=os.getenv("MYSQL_DATABASE")
-    )
+from db_pool import get_mysql_connection, mysql_connection
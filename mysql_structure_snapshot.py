@@ -1,39 +1,100 @@
-import json
+import time
 import argparse
 from datetime import datetime
 from mysql_conn import get_mysql_connection
 from pg_conn import get_pg_connection
+from schema_store import ensure_schema_store, save_version, has_changed, latest_hash
 
 VALID_BACKUP_TYPES = {"backup sql export", "daily update", "sync event"}
 
-def extract_mysql_structure():
-    conn = get_mysql_connection()
-    cursor = conn.cursor()
-    cursor.execute("SHOW TABLES")
-    tables = [row[0] for row in cursor.fetchall()]
+def _text(val):
+    # information_schema columns can come back as bytes on MySQL 8
+    return val.decode("utf-8") if isinstance(val, (bytes, bytearray)) else val
+
+def extract_mysql_structure(cursor=None):
+    """{table: [SHOW COLUMNS-shaped dicts]} for every table, from one information_schema scan."""
+    conn = None
+    if cursor is None:
+        conn = get_mysql_connection()
+        cursor = conn.cursor()
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """)
 
     structure = {}
-    for table in tables:
-        cursor.execute(f"SHOW COLUMNS FROM `{table}`")
-        columns = cursor.fetchall()
-        structure[table] = [
-            {
-                'Field': col[0],
-                'Type': col[1],
-                'Null': col[2],
-                'Key': col[3],
-                'Default': col[4],
-                'Extra': col[5]
-            } for col in columns
-        ]
-    
-    cursor.close()
-    conn.close()
+    for row in cursor.fetchall():
+        table, field, col_type, null, key, default, extra = (_text(v) for v in row)
+        structure.setdefault(table, []).append({
+            'Field': field,
+            'Type': col_type,
+            'Null': null,
+            'Key': key,
+            'Default': default,
+            'Extra': extra
+        })
+
+    if conn is not None:
+        cursor.close()
+        conn.close()
     return structure
 
-def insert_snapshot_to_postgres(structure_dict, backup_type):
+def extract_mysql_indexes(cursor=None):
+    """{table: [{"name", "columns", "unique"}]} for every index, from one information_schema scan."""
+    conn = None
+    if cursor is None:
+        conn = get_mysql_connection()
+        cursor = conn.cursor()
+    cursor.execute("""
+        SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+    """)
+
+    indexes = {}
+    current = None
+    for row in cursor.fetchall():
+        table, name, non_unique, column = (_text(v) for v in row)
+        if current is None or (current["table"], current["name"]) != (table, name):
+            current = {"table": table, "name": name, "columns": [], "unique": not int(non_unique)}
+            indexes.setdefault(table, []).append(current)
+        current["columns"].append(column)
+    for table_indexes in indexes.values():
+        for index in table_indexes:
+            del index["table"]
+
+    if conn is not None:
+        cursor.close()
+        conn.close()
+    return indexes
+
+def extract_mysql_catalog():
+    """(structure, indexes) over a single connection: two catalog queries in total."""
+    conn = get_mysql_connection()
+    cursor = conn.cursor()
+    try:
+        return extract_mysql_structure(cursor), extract_mysql_indexes(cursor)
+    finally:
+        cursor.close()
+        conn.close()
+
+def insert_snapshot_to_postgres(structure_dict, backup_type, indexes=None):
+    """Record a backup event; the structure itself goes to the content-addressed schema store.
+
+    Returns (structure_hash, changed). An unchanged structure is caught by a single hash
+    compare and adds only the event row pointing at the existing version.
+    """
     conn = get_pg_connection()
     cur = conn.cursor()
+    ensure_schema_store(cur)
+    changed = has_changed(cur, structure_dict, indexes)
+    if changed:
+        version_hash, _ = save_version(cur, structure_dict, indexes)
+    else:
+        version_hash = latest_hash(cur)
 
     now = datetime.now()
     sql_backup_date = now if backup_type == "backup sql export" else None
@@ -42,19 +103,20 @@ def insert_snapshot_to_postgres(structure_dict, backup_type):
 
     cur.execute("""
         INSERT INTO accelo_monitor.accelo_backups
-        (backup_type, sql_backup_date, sync_event_date_time, daily_update_date_time, mysql_structure)
+        (backup_type, sql_backup_date, sync_event_date_time, daily_update_date_time, structure_hash)
         VALUES (%s, %s, %s, %s, %s)
     """, (
         backup_type,
         sql_backup_date,
         sync_event_dt,
         daily_update_dt,
-        json.dumps(structure_dict)
+        version_hash
     ))
 
     conn.commit()
     cur.close()
     conn.close()
+    return version_hash, changed
 
 def main():
     parser = argparse.ArgumentParser(description="Capture MySQL structure snapshot and log to PostgreSQL.")
@@ -62,8 +124,11 @@ def main():
                         help="Type of backup event: 'backup sql export', 'daily update', or 'sync event'")
     args = parser.parse_args()
 
-    structure = extract_mysql_structure()
-    insert_snapshot_to_postgres(structure, backup_type=args.type)
+    started = time.perf_counter()
+    structure, indexes = extract_mysql_catalog()
+    print(f"Captured {len(structure)} tables in {(time.perf_counter() - started) * 1000:.0f} ms")
+    version_hash, changed = insert_snapshot_to_postgres(structure, backup_type=args.type, indexes=indexes)
+    print(f"Schema {'changed, new version' if changed else 'unchanged, version'} {version_hash[:12]}")
 
 if __name__ == "__main__":
     main()
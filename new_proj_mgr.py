@@ -1,59 +1,331 @@
 # ---- IMPORTS ----
 
-import requests
-import json
 import os
+import json
+import time
+import argparse
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from auth_grant import get_service_token
+from accelo_fields import fields_param, id_filters, ID_BATCH
 from mysql_conn import get_mysql_connection
+from pg_conn import get_pg_connection
 
 # ---- CONFIGURATION ----
 
 load_dotenv()
 last_modified = os.getenv("LAST_MODIFIED")
 DEPLOYMENT = os.getenv("ACCELO_DEPLOYMENT")
-print(f"Deployment: {DEPLOYMENT}")
+ACCELO_BASE_URL = f"https://{DEPLOYMENT}/api/v0/"
+MYSQL_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_mysql_schema.json"
+SYNC_STATE_TABLE = "accelo_monitor.api_sync_state"
+
+# API resource -> MySQL table it mirrors
+RESOURCES = {
+    "jobs": "job",
+    "companies": "company",
+    "contacts": "contact",
+    "affiliations": "affiliation",
+    "issues": "issue",
+    "tasks": "task",
+    "milestones": "milestone",
+    "prospects": "prospect",
+    "contracts": "contract",
+}
 
-ACCELO_ACCESS_TOKEN = get_service_token()
-print(f"Access Token: {ACCELO_ACCESS_TOKEN}")
+PAGE_LIMIT = 100           # Accelo's maximum _limit
+API_WORKERS = int(os.getenv("ACCELO_API_WORKERS", "4"))
+API_RETRIES = 6
+API_TIMEOUT = 60
+UPSERT_BATCH_ROWS = 500
+OVERLAP_SECONDS = 60       # re-read a minute behind the high-water mark; upserts are idempotent
 
 # ---- API REQUEST ----
 
-ACCELO_BASE_URL = f"https://{DEPLOYMENT}/api/v0/"
-headers = {
-    "Authorization": f"Bearer {ACCELO_ACCESS_TOKEN}",
-    "Accept": "application/json"
-}
+_session = None
+_session_lock = threading.Lock()
+_pause_until = [0.0]       # shared back-off after a 429, honoured by every worker
+
+
+def accelo_headers():
+    # Token is fetched on first use (and served from the token cache after that), not at import.
+    return {
+        "Authorization": f"Bearer {get_service_token()}",
+        "Accept": "application/json"
+    }
+
+
+def get_session():
+    """One pooled keep-alive session shared by all API workers."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=API_WORKERS, pool_maxsize=API_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def api_get(path, params=None):
+    """GET an Accelo API path and return its "response" payload.
+
+    A 429 pauses every worker for Retry-After seconds; 5xx and network errors are
+    retried with exponential back-off; a 401 refreshes the token once.
+    """
+    refreshed = False
+    for attempt in range(API_RETRIES):
+        wait = _pause_until[0] - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            r = get_session().get(f"{ACCELO_BASE_URL}{path}", headers=accelo_headers(), params=params, timeout=API_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"Request to {path} failed ({e}); retrying...")
+            time.sleep(min(2 ** attempt, 60))
+            continue
+
+        if r.status_code == 429:
+            delay = float(r.headers.get("Retry-After", 2 ** attempt))
+            _pause_until[0] = max(_pause_until[0], time.monotonic() + delay)
+            print(f"Rate limited on {path}; pausing {delay:.0f}s")
+            continue
+        if r.status_code == 401 and not refreshed:
+            refreshed = True
+            get_service_token(force_refresh=True)   # later attempts read the new token from the cache
+            continue
+        if r.status_code >= 500:
+            time.sleep(min(2 ** attempt, 60))
+            continue
+        r.raise_for_status()
+        return r.json().get("response")
+    raise RuntimeError(f"Accelo API {path} still failing after {API_RETRIES} attempts")
+
+
+def modified_filter(since):
+    return f"date_modified_after({int(since)})"
+
+
+def count_modified(resource, since):
+    response = api_get(f"{resource}/count", {"_filters": modified_filter(since)})
+    return int(response.get("count", 0)) if response else 0
+
+
+def fetch_page(resource, since, page):
+    params = {
+        "_filters": modified_filter(since),
+        "_fields": fields_param(RESOURCES[resource]),
+        "_order_by": "id",
+        "_limit": PAGE_LIMIT,
+        "_page": page,
+    }
+    return api_get(resource, params) or []
+
+
+def fetch_modified(resource, since, workers=API_WORKERS):
+    """All records of `resource` modified after `since` (unix time), pages fetched concurrently."""
+    total = count_modified(resource, since)
+    pages = -(-total // PAGE_LIMIT)
+    if not pages:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, pages)) as pool:
+        results = pool.map(lambda page: fetch_page(resource, since, page), range(pages))
+        records = {}
+        for page in results:
+            for record in page:
+                records[record["id"]] = record   # pages can overlap if rows change mid-sync
+    return list(records.values())
 
-params = {
-    "date_modified__gt": last_modified,
-    "limit": 50,
-    "start": 0
-}
-response = requests.get(f"{ACCELO_BASE_URL}jobs", headers=headers, params=params)
+
+def fetch_by_ids(resource, ids, workers=API_WORKERS):
+    """Fetch specific records, ID_BATCH ids per request via _filters=id(...)."""
+    fields = fields_param(RESOURCES[resource])
+    batches = id_filters(ids)
+    if not batches:
+        return []
+    fetch = lambda f: api_get(resource, {"_filters": f, "_fields": fields, "_limit": ID_BATCH}) or []
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        return [record for batch in pool.map(fetch, batches) for record in batch]
+
+# ---- SYNC STATE ----
+
+def parse_last_modified(value):
+    """LAST_MODIFIED from .env as unix time; accepts epoch seconds or an ISO-8601 date."""
+    if not value:
+        return 0
+    if value.strip().isdigit():
+        return int(value)
+    dt = datetime.fromisoformat(value.strip())
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def ensure_sync_state(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SYNC_STATE_TABLE} (
+            resource TEXT PRIMARY KEY,
+            high_water BIGINT NOT NULL,
+            rows_synced INTEGER NOT NULL DEFAULT 0,
+            synced_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def get_high_water(cursor, resource):
+    """Stored high-water mark, seeded from LAST_MODIFIED the first time a resource syncs."""
+    cursor.execute(f"SELECT high_water FROM {SYNC_STATE_TABLE} WHERE resource = %s", (resource,))
+    row = cursor.fetchone()
+    return row[0] if row else parse_last_modified(last_modified)
+
+
+def set_high_water(cursor, resource, high_water, rows):
+    cursor.execute(f"""
+        INSERT INTO {SYNC_STATE_TABLE} (resource, high_water, rows_synced, synced_at)
+        VALUES (%s, %s, %s, now())
+        ON CONFLICT (resource) DO UPDATE
+        SET high_water = EXCLUDED.high_water, rows_synced = EXCLUDED.rows_synced, synced_at = EXCLUDED.synced_at
+    """, (resource, high_water, rows))
 
 # ---- PROCESS RESPONSE ----
 
-def update_env_last_modified(new_value, env_path=".env"):
-    lines = []
-    replaced = False
+_mysql_schema = None
+
+
+def get_table_columns(table):
+    """{column: mysql type} for a table, from parse_mysql_schema.py's export."""
+    global _mysql_schema
+    if _mysql_schema is None:
+        with open(MYSQL_SCHEMA_PATH, "r", encoding="utf-8") as f:
+            _mysql_schema = {k.lower(): v for k, v in json.load(f).items()}
+    return {c["name"]: c["type"].lower() for c in _mysql_schema.get(table.lower(), [])}
+
+
+def to_mysql_value(val, col_type):
+    """API values are strings; dates arrive as unix timestamps."""
+    if val in (None, ""):
+        return None
+    if col_type.startswith(("datetime", "timestamp", "date")) and str(val).isdigit():
+        dt = datetime.fromtimestamp(int(val), tz=timezone.utc)
+        return dt.date() if col_type.startswith("date ") or col_type == "date" else dt.replace(tzinfo=None)
+    return val
 
-    with open(env_path, "r") as file:
-        for line in file:
-            if line.startswith("LAST_MODIFIED="):
-                lines.append(f"LAST_MODIFIED={new_value}\n")
-                replaced = True
-            else:
-                lines.append(line)
 
-    if not replaced:
-        lines.append(f"LAST_MODIFIED={new_value}\n")
+def records_to_rows(records, table):
+    """Project API records onto the table's columns; nested objects are left to their own resources."""
+    columns = get_table_columns(table)
+    fields = sorted({k for r in records for k, v in r.items()
+                     if k in columns and not isinstance(v, (dict, list))})
+    rows = [tuple(to_mysql_value(r.get(f), columns[f]) for f in fields) for r in records]
+    return fields, rows
 
-    with open(env_path, "w") as file:
-        file.writelines(lines)
 
-    print(f"✅ LAST_MODIFIED updated to {new_value}")
+def upsert_mysql(conn, table, fields, rows):
+    cols = ', '.join(f"`{f}`" for f in fields)
+    marks = ', '.join(["%s"] * len(fields))
+    updates = ', '.join(f"`{f}` = VALUES(`{f}`)" for f in fields if f != "id") or "`id` = `id`"
+    sql = f"INSERT INTO `{table}` ({cols}) VALUES ({marks}) ON DUPLICATE KEY UPDATE {updates}"
+    cursor = conn.cursor()
+    try:
+        for i in range(0, len(rows), UPSERT_BATCH_ROWS):
+            cursor.executemany(sql, rows[i:i + UPSERT_BATCH_ROWS])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
 
 
+# ---- SYNC ----
+
+def sync_resource(resource, mysql_conn, pg_conn, full=False, workers=API_WORKERS):
+    """Pull records modified since the resource's high-water mark and upsert them into MySQL.
+
+    The mark only advances after the MySQL batch commits, so a failed run is simply
+    repeated next time.
+    """
+    table = RESOURCES[resource]
+    pg_cursor = pg_conn.cursor()
+    high_water = 0 if full else get_high_water(pg_cursor, resource)
+    since = max(0, high_water - OVERLAP_SECONDS)
+
+    started = time.perf_counter()
+    fetch_started = int(time.time())
+    records = fetch_modified(resource, since, workers)
+    if records:
+        fields, rows = records_to_rows(records, table)
+        upsert_mysql(mysql_conn, table, fields, rows)
+        newest = max(int(r.get("date_modified") or 0) for r in records)
+        # Rows edited while we paged may have moved between pages; never step past the
+        # fetch start so the next run re-reads them.
+        high_water = max(high_water, min(newest, fetch_started))
+
+    set_high_water(pg_cursor, resource, high_water, len(records))
+    pg_conn.commit()
+    pg_cursor.close()
+    seconds = time.perf_counter() - started
+    print(f"  → {resource}: {len(records)} records upserted into {table} in {seconds:.1f}s "
+          f"(high water {datetime.fromtimestamp(high_water, tz=timezone.utc):%Y-%m-%d %H:%M:%S})")
+    return {"resource": resource, "records": len(records), "high_water": high_water, "seconds": seconds}
+
+
+def refresh_records(resource, ids, workers=API_WORKERS):
+    """Re-pull specific records into MySQL; the high-water mark is left alone."""
+    table = RESOURCES[resource]
+    records = fetch_by_ids(resource, ids, workers)
+    if records:
+        mysql_conn = get_mysql_connection()
+        try:
+            upsert_mysql(mysql_conn, table, *records_to_rows(records, table))
+        finally:
+            mysql_conn.close()
+    print(f"  → {resource}: {len(records)} of {len(set(ids))} records refreshed into {table}")
+    return records
+
+
+def run_api_sync(resources=None, full=False, workers=API_WORKERS):
+    """Incrementally sync each resource; returns per-resource results (with "error" on failure)."""
+    resources = resources or list(RESOURCES)
+    mysql_conn = get_mysql_connection()
+    pg_conn = get_pg_connection()
+    cursor = pg_conn.cursor()
+    ensure_sync_state(cursor)
+    pg_conn.commit()
+    cursor.close()
+
+    results = []
+    try:
+        for resource in resources:
+            try:
+                results.append(sync_resource(resource, mysql_conn, pg_conn, full, workers))
+            except Exception as e:
+                pg_conn.rollback()
+                print(f"  → {resource}: failed: {e}")
+                results.append({"resource": resource, "error": str(e)})
+    finally:
+        mysql_conn.close()
+        pg_conn.close()
+    return results
+
 # ---- MAIN EXECUTION ----
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental Accelo API sync into MySQL")
+    parser.add_argument("--resources", nargs="+", choices=sorted(RESOURCES), help="Resources to sync (default: all)")
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Concurrent page requests per resource")
+    parser.add_argument("--full", action="store_true", help="Ignore high-water marks and re-read everything")
+    parser.add_argument("--ids", nargs="+", help="Refresh just these record ids (needs exactly one --resources)")
+    args = parser.parse_args()
+
+    print(f"Deployment: {DEPLOYMENT}")
+    if args.ids:
+        if not args.resources or len(args.resources) != 1:
+            parser.error("--ids needs exactly one resource in --resources")
+        refresh_records(args.resources[0], args.ids, args.workers)
+    else:
+        run_api_sync(args.resources, args.full, args.workers)
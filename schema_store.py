@@ -0,0 +1,218 @@
+import json
+import hashlib
+
+# --- CONFIG ---
+VERSIONS_TABLE = "accelo_monitor.schema_versions"
+BACKUPS_TABLE = "accelo_monitor.accelo_backups"
+KEYFRAME_EVERY = 10   # store a full copy after this many deltas, bounding reconstruction cost
+
+_cache = {}           # structure_hash -> document; versions are immutable
+
+
+# --- DOCUMENTS ---
+def make_document(structure, indexes=None):
+    """Flatten a snapshot into {"columns/<table>": [...], "indexes/<table>": [...]}."""
+    doc = {f"columns/{table}": cols for table, cols in structure.items()}
+    for table, table_indexes in (indexes or {}).items():
+        doc[f"indexes/{table}"] = table_indexes
+    return doc
+
+
+def split_document(doc):
+    """Inverse of make_document(): (structure, indexes)."""
+    structure, indexes = {}, {}
+    for key, value in doc.items():
+        section, table = key.split("/", 1)
+        (structure if section == "columns" else indexes)[table] = value
+    return structure, indexes
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def structure_hash(structure, indexes=None):
+    """Content hash of a snapshot; equal hashes mean identical structures."""
+    return hashlib.sha256(canonical(make_document(structure, indexes)).encode("utf-8")).hexdigest()
+
+
+def make_delta(old_doc, new_doc):
+    return {
+        "set": {k: v for k, v in new_doc.items() if canonical(old_doc.get(k)) != canonical(v)},
+        "unset": sorted(k for k in old_doc if k not in new_doc),
+    }
+
+
+def apply_delta(doc, delta):
+    doc = dict(doc)
+    for key in delta["unset"]:
+        doc.pop(key, None)
+    doc.update(delta["set"])
+    return doc
+
+
+# --- STORAGE ---
+def ensure_schema_store(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} (
+            structure_hash TEXT PRIMARY KEY,
+            parent_hash TEXT REFERENCES {VERSIONS_TABLE} (structure_hash),
+            kind TEXT NOT NULL CHECK (kind IN ('keyframe', 'delta')),
+            depth INTEGER NOT NULL,
+            payload JSONB NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+    # ALTER TABLE takes an ACCESS EXCLUSIVE lock even when it has nothing to do, so
+    # only migrate accelo_backups when the catalog says it still needs it.
+    schema, table = BACKUPS_TABLE.split(".")
+    cursor.execute("""
+        SELECT column_name, is_nullable FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s AND column_name IN ('structure_hash', 'mysql_structure')
+    """, (schema, table))
+    columns = dict(cursor.fetchall())
+    if "structure_hash" not in columns:
+        cursor.execute(f"ALTER TABLE {BACKUPS_TABLE} ADD COLUMN IF NOT EXISTS structure_hash TEXT")
+    if columns.get("mysql_structure") == "NO":
+        cursor.execute(f"ALTER TABLE {BACKUPS_TABLE} ALTER COLUMN mysql_structure DROP NOT NULL")
+
+
+def latest_hash(cursor):
+    """structure_hash of the most recent snapshot event, or None."""
+    cursor.execute(f"""
+        SELECT structure_hash FROM {BACKUPS_TABLE}
+        WHERE structure_hash IS NOT NULL
+        ORDER BY COALESCE(sql_backup_date, sync_event_date_time, daily_update_date_time) DESC NULLS LAST
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def has_changed(cursor, structure, indexes=None):
+    """O(1) check for the sync pipeline: does this structure differ from the last snapshot?"""
+    return structure_hash(structure, indexes) != latest_hash(cursor)
+
+
+def get_version(cursor, version_hash):
+    """Rebuild the snapshot document stored under version_hash, or None if unknown."""
+    if version_hash in _cache:
+        return _cache[version_hash]
+    chain = []
+    doc = None
+    current = version_hash
+    while current is not None:
+        if current in _cache:
+            doc = _cache[current]
+            break
+        cursor.execute(f"SELECT parent_hash, kind, payload FROM {VERSIONS_TABLE} WHERE structure_hash = %s",
+                       (current,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        parent, kind, payload = row
+        payload = json.loads(payload) if isinstance(payload, str) else payload
+        if kind == "keyframe":
+            doc = payload
+            _cache[current] = doc
+            break
+        chain.append((current, payload))
+        current = parent
+    if doc is None:
+        return None
+    for version, delta in reversed(chain):
+        doc = apply_delta(doc, delta)
+        _cache[version] = doc
+    return doc
+
+
+def save_version(cursor, structure, indexes=None):
+    """Store a snapshot by content hash; returns (structure_hash, changed).
+
+    `changed` is whether the structure differs from the latest snapshot, so a revert
+    to an older version counts as a change. A known hash stores nothing. A new one is
+    stored as a delta against the latest snapshot, or as a full keyframe every
+    KEYFRAME_EVERY versions.
+    """
+    version_hash = structure_hash(structure, indexes)
+    parent = latest_hash(cursor)
+    changed = version_hash != parent
+    cursor.execute(f"SELECT 1 FROM {VERSIONS_TABLE} WHERE structure_hash = %s", (version_hash,))
+    if cursor.fetchone():
+        return version_hash, changed
+
+    doc = make_document(structure, indexes)
+    parent_doc = get_version(cursor, parent) if parent else None
+    depth = 0
+    if parent_doc is not None:
+        cursor.execute(f"SELECT depth FROM {VERSIONS_TABLE} WHERE structure_hash = %s", (parent,))
+        depth = cursor.fetchone()[0] + 1
+    if parent_doc is None or depth >= KEYFRAME_EVERY:
+        kind, payload, parent, depth = "keyframe", doc, None, 0
+    else:
+        kind, payload = "delta", make_delta(parent_doc, doc)
+
+    cursor.execute(f"""
+        INSERT INTO {VERSIONS_TABLE} (structure_hash, parent_hash, kind, depth, payload)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (structure_hash) DO NOTHING
+    """, (version_hash, parent, kind, depth, canonical(payload)))
+    _cache[version_hash] = doc
+    return version_hash, changed
+
+
+# --- QUERIES ---
+def get_schema(cursor, version_hash):
+    """(structure, indexes) for a version."""
+    doc = get_version(cursor, version_hash)
+    return split_document(doc) if doc is not None else None
+
+
+def get_schema_at(cursor, when):
+    """(structure_hash, structure, indexes) in effect at datetime `when`, or None."""
+    cursor.execute(f"""
+        SELECT structure_hash FROM {BACKUPS_TABLE}
+        WHERE structure_hash IS NOT NULL
+          AND COALESCE(sql_backup_date, sync_event_date_time, daily_update_date_time) <= %s
+        ORDER BY COALESCE(sql_backup_date, sync_event_date_time, daily_update_date_time) DESC
+        LIMIT 1
+    """, (when,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    schema = get_schema(cursor, row[0])
+    if schema is None:
+        return None
+    return (row[0],) + schema
+
+
+def diff_documents(old_doc, new_doc):
+    """Table/column/index level differences between two snapshot documents."""
+    old_structure, old_indexes = split_document(old_doc)
+    new_structure, new_indexes = split_document(new_doc)
+    diff = {
+        "added_tables": sorted(new_structure.keys() - old_structure.keys()),
+        "removed_tables": sorted(old_structure.keys() - new_structure.keys()),
+        "changed_tables": {},
+    }
+    for table in sorted(old_structure.keys() & new_structure.keys()):
+        old_cols = {c.get("Field", c.get("name")): c for c in old_structure[table]}
+        new_cols = {c.get("Field", c.get("name")): c for c in new_structure[table]}
+        changes = {
+            "added_columns": [c for c in new_cols if c not in old_cols],
+            "removed_columns": [c for c in old_cols if c not in new_cols],
+            "changed_columns": {c: {"old": old_cols[c], "new": new_cols[c]} for c in new_cols
+                                if c in old_cols and canonical(old_cols[c]) != canonical(new_cols[c])},
+        }
+        if canonical(old_indexes.get(table)) != canonical(new_indexes.get(table)):
+            changes["indexes"] = {"old": old_indexes.get(table, []), "new": new_indexes.get(table, [])}
+        if any(changes.values()):
+            diff["changed_tables"][table] = changes
+    return diff
+
+
+def diff_versions(cursor, old_hash, new_hash):
+    """diff_documents() between two stored versions (O(1) when the hashes are equal)."""
+    if old_hash == new_hash:
+        return {"added_tables": [], "removed_tables": [], "changed_tables": {}}
+    return diff_documents(get_version(cursor, old_hash), get_version(cursor, new_hash))
@@ -1,6 +1,8 @@
-import os, time, re, requests
+import os, time, re, json, hashlib, threading, requests
+from concurrent.futures import ThreadPoolExecutor
 from msal import ConfidentialClientApplication
 from dotenv import load_dotenv
+from token_manager import get_manager
 
 load_dotenv()
 TENANT_ID = os.getenv("TENANT_ID_WATCHDOG")
@@ -8,18 +10,37 @@ CLIENT_ID = os.getenv("CLIENT_ID_WATCHDOG")
 CLIENT_SECRET = os.getenv("WATCHDOG_SECRET")
 EMAIL_ADDRESS = os.getenv("WATCHDOG_EMAIL")
 SAVE_FOLDER = os.getenv("SAVE_FOLDER")
+DOWNLOAD_PARTS = int(os.getenv("DOWNLOAD_PARTS", "4"))
+DOWNLOAD_CHUNK = 1 << 20
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_RETRIES = 8
+DOWNLOAD_STATE_EVERY = 16 << 20  # persist resume offsets every 16 MB
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+GRAPH_AUTHORITY_URL = os.getenv("GRAPH_AUTHORITY_URL", "https://login.microsoftonline.com").rstrip("/")
+GRAPH_TOKEN = os.getenv("GRAPH_TOKEN")   # fixed bearer token (e.g. for a stub Graph endpoint); skips MSAL
+WATCH_MIN_WAIT = float(os.getenv("WATCH_MIN_WAIT", "2"))    # seconds between delta polls while active
+WATCH_MAX_WAIT = float(os.getenv("WATCH_MAX_WAIT", "30"))   # ceiling once the mailbox has been quiet
+WATCH_BACKOFF = 1.5
 
-def get_token():
+def fetch_graph_token():
     app = ConfidentialClientApplication(
         client_id=CLIENT_ID,
-        authority=f"https://login.microsoftonline.com/{TENANT_ID}",
+        authority=f"{GRAPH_AUTHORITY_URL}/{TENANT_ID}",
         client_credential=CLIENT_SECRET
     )
     result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-    return result["access_token"]
+    if "access_token" not in result:
+        raise RuntimeError(f"Graph token request failed: {result.get('error_description', result)}")
+    return result["access_token"], result.get("expires_in", 3600)
+
+def get_token(force_refresh=False):
+    """Cached Graph token; only hits the identity platform when it is about to expire."""
+    if GRAPH_TOKEN:
+        return GRAPH_TOKEN
+    return get_manager(f"graph:{TENANT_ID}:{CLIENT_ID}", fetch_graph_token).get(force_refresh)
 
 def find_latest_sql_email(token):
-    endpoint = f"https://graph.microsoft.com/v1.0/users/{EMAIL_ADDRESS}/messages"
+    endpoint = f"{GRAPH_BASE_URL}/users/{EMAIL_ADDRESS}/messages"
     params = {"$search": '"SQL Export Complete"', "$top": 5}
     headers = {
         "Authorization": f"Bearer {token}",
@@ -30,32 +51,161 @@ def find_latest_sql_email(token):
     return response.json().get("value", [])
 
 def extract_download_link(html):
-    match = re.search(r'https://polarisforensics\.accelo\.com/redirect\?s3url=[^"]+', html)
+    match = re.search(r'https://polarisforensics\.accelo\.com/redirect\?s3url=[^"\s<>]+', html)
     return match.group(0) if match else None
 
-def download_sql(link, dump_dir=SAVE_FOLDER):
-    os.makedirs(dump_dir, exist_ok=True)
-    r = requests.get(link)
+def parse_filename(headers, default="accelo_download.zip"):
+    match = re.search(r'filename="?([^";]+)"?', headers.get('Content-Disposition', ''))
+    return match.group(1) if match else default
+
+def probe_download(session, link):
+    """Resolve the link and learn (url, total_size, filename, etag, supports_ranges) with a 1-byte request."""
+    r = session.get(link, headers={"Range": "bytes=0-0"}, stream=True, timeout=DOWNLOAD_TIMEOUT)
     r.raise_for_status()
+    r.close()
+    etag = r.headers.get("ETag", "").strip('"')
+    fname = parse_filename(r.headers)
+    match = re.match(r"bytes \d+-\d+/(\d+)", r.headers.get("Content-Range", ""))
+    if r.status_code == 206 and match:
+        return r.url, int(match.group(1)), fname, etag, True
+    length = r.headers.get("Content-Length")
+    return r.url, int(length) if length else None, fname, etag, False
 
-    # Extract filename from Content-Disposition header
-    content_disp = r.headers.get('Content-Disposition', '')
-    match = re.search(r'filename="?([^";]+)"?', content_disp)
-    if match:
-        fname = match.group(1)
-    else:
-        # fallback if header not found
-        fname = "accelo_download.zip"
+def load_part_state(state_path, total, etag):
+    """Byte ranges still to fetch from an interrupted download of the same file, else None."""
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("size") != total or state.get("etag") != etag:
+        return None
+    return state["ranges"]
+
+def save_part_state(state_path, total, etag, ranges):
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"size": total, "etag": etag, "ranges": ranges}, f)
+    os.replace(tmp, state_path)
+
+def split_ranges(total, parts):
+    step = -(-total // parts)
+    return [[start, min(start + step, total) - 1] for start in range(0, total, step)]
+
+def fetch_range(session, url, part_path, rng, on_chunk):
+    """Download rng=[start, end] into part_path, resuming after network errors.
+
+    rng[0] advances as bytes land on disk, so the caller can persist progress.
+    """
+    for attempt in range(DOWNLOAD_RETRIES):
+        if rng[0] > rng[1]:
+            return
+        try:
+            headers = {"Range": f"bytes={rng[0]}-{rng[1]}"}
+            with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                if r.status_code != 206:
+                    raise requests.HTTPError(f"Expected 206 for range request, got {r.status_code}")
+                with open(part_path, "r+b", buffering=0) as f:
+                    f.seek(rng[0])
+                    for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                        f.write(chunk)
+                        rng[0] += len(chunk)
+                        on_chunk(len(chunk))
+            if rng[0] > rng[1]:
+                return
+        except (requests.RequestException, OSError) as e:
+            wait = min(2 ** attempt, 60)
+            print(f"Download interrupted at byte {rng[0]} ({e}); resuming in {wait}s...")
+            time.sleep(wait)
+    raise RuntimeError(f"Range {rng} still incomplete after {DOWNLOAD_RETRIES} attempts")
+
+def fetch_whole(session, url, part_path, on_chunk):
+    """Plain streamed download for servers without Range support (restarts on failure)."""
+    with session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        r.raise_for_status()
+        with open(part_path, "wb") as f:
+            for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                f.write(chunk)
+                on_chunk(len(chunk))
+
+def file_digest(path, algorithm):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def verify_download(path, total, etag, expected_sha256=None):
+    size = os.path.getsize(path)
+    if total is not None and size != total:
+        raise RuntimeError(f"Size mismatch: got {size} bytes, expected {total}")
+    # A single-part S3 ETag is the object's MD5; multipart ETags contain a '-'.
+    if re.fullmatch(r"[0-9a-f]{32}", etag or "") and file_digest(path, "md5") != etag:
+        raise RuntimeError("MD5 does not match the ETag")
+    if expected_sha256 and file_digest(path, "sha256") != expected_sha256.lower():
+        raise RuntimeError("SHA-256 mismatch")
+
+def download_sql(link, dump_dir=SAVE_FOLDER, parts=DOWNLOAD_PARTS, expected_sha256=None):
+    """Stream the export to <name>.part in fixed-size chunks, then verify and rename it.
+
+    Interrupted range downloads resume from the .part file and its progress sidecar,
+    and `parts` > 1 fetches that many byte ranges in parallel. Memory stays at one
+    chunk per part regardless of export size.
+    """
+    os.makedirs(dump_dir, exist_ok=True)
+    session = requests.Session()
+    url, total, fname, etag, ranged = probe_download(session, link)
 
     path = os.path.join(dump_dir, fname)
-    with open(path, "wb") as f:
-        f.write(r.content)
-    
-    print(f"SQL export saved: {path}")
+    part_path = path + ".part"
+    state_path = part_path + ".json"
+
+    lock = threading.Lock()
+    received = [0]
+    started = time.perf_counter()
+
+    if not ranged or not total:
+        def on_chunk(n):
+            received[0] += n
+        fetch_whole(session, url, part_path, on_chunk)
+    else:
+        ranges = load_part_state(state_path, total, etag) if os.path.exists(part_path) else None
+        if ranges is None:
+            with open(part_path, "wb") as f:
+                f.truncate(total)
+            ranges = split_ranges(total, max(1, parts))
+        else:
+            print(f"Resuming download of {fname}")
+        save_part_state(state_path, total, etag, ranges)
+        last_saved = [0]
+
+        def on_chunk(n):
+            with lock:
+                received[0] += n
+                if received[0] - last_saved[0] >= DOWNLOAD_STATE_EVERY:
+                    last_saved[0] = received[0]
+                    save_part_state(state_path, total, etag, ranges)
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                for future in [pool.submit(fetch_range, session, url, part_path, rng, on_chunk) for rng in ranges]:
+                    future.result()
+        finally:
+            with lock:
+                save_part_state(state_path, total, etag, ranges)
+
+    verify_download(part_path, total, etag, expected_sha256)
+    os.replace(part_path, path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+    seconds = time.perf_counter() - started
+    mb = received[0] / (1024 * 1024)
+    print(f"SQL export saved: {path} ({mb:.1f} MB in {seconds:.1f}s, {mb / seconds if seconds else 0:.1f} MB/s)")
     return path
 
 def delete_email(token, msg_id):
-    endpoint = f"https://graph.microsoft.com/v1.0/users/{EMAIL_ADDRESS}/messages/{msg_id}"
+    endpoint = f"{GRAPH_BASE_URL}/users/{EMAIL_ADDRESS}/messages/{msg_id}"
     headers = {"Authorization": f"Bearer {token}"}
     r = requests.delete(endpoint, headers=headers)
     if r.status_code == 204:
@@ -63,30 +213,108 @@ def delete_email(token, msg_id):
     else:
         print(f"Failed to delete email: {r.text}")
 
-def run_watchdog():
-    print("Accelo watchdog started.")
-    token = get_token()
+def is_export_email(msg):
+    return (
+        msg.get("from", {}).get("emailAddress", {}).get("address") == "noreply@accelo.com" and
+        "SQL Export Complete" in (msg.get("subject") or "")
+    )
+
+def find_export_email(token):
+    """Return (msg_id, download_link) for the newest SQL export email, or None."""
     messages = find_latest_sql_email(token)
 
     for msg in messages:
-        if (
-            msg.get("from", {}).get("emailAddress", {}).get("address") == "noreply@accelo.com" and
-            "SQL Export Complete" in msg.get("subject", "")
-        ):
-            msg_id = msg["id"]
+        if is_export_email(msg):
             html = msg.get("body", {}).get("content", "")
             link = extract_download_link(html)
             if link:
-                download_sql(link)
-                delete_email(token, msg_id)
-                print("Watchdog success: SQL export downloaded and email deleted.")
-                return True
-            else:
-                print("Watchdog error: Link not found.")
-                return False
+                return msg["id"], link
+            print("Watchdog error: Link not found.")
+            return None
 
     print("Watchdog error: No matching SQL export email found.")
-    return False
+    return None
+
+def fetch_inbox_delta(session, token, delta_link=None):
+    """Run one Graph delta round on the inbox; returns (changed_messages, next_delta_link).
+
+    Without a delta_link this is the initial sync and lists the whole inbox.
+    """
+    url = delta_link or f"{GRAPH_BASE_URL}/users/{EMAIL_ADDRESS}/mailFolders/inbox/messages/delta"
+    params = None if delta_link else {"$select": "id,subject,from,body,receivedDateTime"}
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Prefer": 'outlook.body-content-type="text"',
+    }
+    messages = []
+    while True:
+        r = session.get(url, headers=headers, params=params, timeout=DOWNLOAD_TIMEOUT)
+        r.raise_for_status()
+        page = r.json()
+        messages.extend(m for m in page.get("value", []) if "@removed" not in m)
+        if "@odata.nextLink" in page:
+            url, params = page["@odata.nextLink"], None
+            continue
+        return messages, page.get("@odata.deltaLink")
+
+def watch_for_export(timeout=None):
+    """Block until an SQL export email is in the inbox; returns (token, msg_id, link), or None on timeout.
+
+    Polls the inbox with Graph delta queries, which only return what changed since the
+    previous round, so polls are cheap and can run every few seconds. The wait grows
+    from WATCH_MIN_WAIT to WATCH_MAX_WAIT while nothing changes and drops back on any
+    change. When the delta endpoint fails it falls back to the $search query.
+    """
+    print("Accelo watchdog started (delta watch).")
+    session = requests.Session()
+    token = get_token()
+    delta_link = None
+    wait = WATCH_MIN_WAIT
+    deadline = time.monotonic() + timeout if timeout else None
+
+    while True:
+        try:
+            messages, delta_link = fetch_inbox_delta(session, token, delta_link)
+            candidates = [m for m in messages if is_export_email(m)]
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status in (404, 410):
+                delta_link = None  # delta token expired; start a fresh sync
+            print(f"Delta query failed ({e}); falling back to search.")
+            messages, candidates = [], []
+            try:
+                if status == 401:
+                    token = get_token(force_refresh=True)
+                candidates = [m for m in find_latest_sql_email(token) if is_export_email(m)]
+            except (requests.RequestException, RuntimeError) as e:
+                print(f"Search fallback failed ({e}); retrying.")
+        except requests.RequestException as e:
+            print(f"Delta query failed ({e}); retrying.")
+            messages, candidates = [], []
+
+        for msg in candidates:
+            link = extract_download_link(msg.get("body", {}).get("content", ""))
+            if link:
+                return token, msg["id"], link
+            print("Watchdog error: Link not found.")
+
+        wait = WATCH_MIN_WAIT if messages else min(wait * WATCH_BACKOFF, WATCH_MAX_WAIT)
+        if deadline and time.monotonic() + wait > deadline:
+            return None
+        time.sleep(wait)
+
+def run_watchdog():
+    print("Accelo watchdog started.")
+    token = get_token()
+    found = find_export_email(token)
+    if not found:
+        return False
+
+    msg_id, link = found
+    download_sql(link)
+    delete_email(token, msg_id)
+    print("Watchdog success: SQL export downloaded and email deleted.")
+    return True
 
 if __name__ == "__main__":
     run_watchdog()
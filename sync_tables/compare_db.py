@@ -1,15 +1,78 @@
 import json
+from dataclasses import dataclass, field, asdict
 
 PG_FILE = r"C:/polaris_sync_agent/sync_tables/accelo_pg_schema.json"
+PG_INDEX_FILE = r"C:/polaris_sync_agent/sync_tables/accelo_pg_indexes.json"
 MYSQL_FILE = r"C:/polaris_sync_agent/sync_tables/accelo_mysql_schema.json"
+MYSQL_KEYS_FILE = r"C:/polaris_sync_agent/sync_tables/accelo_mysql_keys.json"
 OUTPUT_REPORT = r"C:/polaris_sync_agent/sync_tables/schema_diff_report.txt"
+OUTPUT_JSON_REPORT = r"C:/polaris_sync_agent/sync_tables/schema_diff_report.json"
 
+# --- DIFF TYPES ---
+@dataclass
+class TypeMismatch:
+    column: str
+    mysql_type: str
+    pg_type: str
+    compatibility: str
+
+
+@dataclass
+class TableDiff:
+    table: str
+    missing_columns: list = field(default_factory=list)
+    type_mismatches: list = field(default_factory=list)      # [TypeMismatch]
+    mysql_primary_key: list = field(default_factory=list)
+    pg_primary_key: list = field(default_factory=list)
+    missing_indexes: list = field(default_factory=list)      # MySQL indexes with no PG index on the same columns
+
+    @property
+    def primary_key_differs(self):
+        return bool(self.mysql_primary_key) and self.mysql_primary_key != self.pg_primary_key
+
+    def is_empty(self):
+        return not (self.missing_columns or self.type_mismatches or self.primary_key_differs or self.missing_indexes)
+
+
+@dataclass
+class SchemaDiff:
+    missing_tables: list = field(default_factory=list)
+    tables: dict = field(default_factory=dict)                # table -> TableDiff
+
+    def is_empty(self):
+        return not self.missing_tables and not self.tables
+
+    def to_dict(self):
+        return asdict(self)
+
+# --- LOADING ---
 def load_schema(path):
     with open(path, 'r') as f:
         return json.load(f)
 
-def is_compatible(mysql_type, pg_type):
+def load_optional(path):
+    try:
+        return load_schema(path)
+    except (OSError, ValueError):
+        return {}
+
+def load_cached_schemas():
+    """(mysql_schema, pg_schema, mysql_keys, pg_indexes) from the exported JSON snapshots."""
+    return load_schema(MYSQL_FILE), load_schema(PG_FILE), load_optional(MYSQL_KEYS_FILE), load_optional(PG_INDEX_FILE)
+
+def load_live_pg_schema(cursor):
+    """(pg_schema, pg_indexes) straight from the accelo_tap catalog."""
+    from export_pg_schema import get_schema_structure, get_index_structure
+    return get_schema_structure(cursor), get_index_structure(cursor)
+
+# --- COMPARISON ---
+def mysql_base_type(mysql_type):
+    """Strip column attributes (int(11) unsigned NOT NULL -> int(11)); enum literals may hold spaces."""
     mysql_type = mysql_type.lower()
+    return mysql_type if mysql_type.startswith("enum(") else mysql_type.split(" ", 1)[0]
+
+def is_compatible(mysql_type, pg_type):
+    mysql_type = mysql_base_type(mysql_type)
     pg_type = pg_type.lower()
 
     rules = [
@@ -30,70 +93,117 @@ def is_compatible(mysql_type, pg_type):
 
     return False, "incompatible"
 
-def compare_schemas(pg_schema, mysql_schema):
-    # Normalize both schema keys to lowercase for comparison
+def pg_primary_key(pg_columns, pg_table_indexes):
+    for index in pg_table_indexes or []:
+        if index.get("primary"):
+            return [c.lower() for c in index["columns"]]
+    return [c["name"].lower() for c in pg_columns if c.get("primary_key")]
+
+def diff_schemas(mysql_schema, pg_schema, mysql_keys=None, pg_indexes=None):
+    """Structured MySQL -> accelo_tap difference.
+
+    `mysql_keys` ({table: {"primary_key", "indexes"}}) and `pg_indexes` are optional;
+    without them keys and indexes are not compared.
+    """
     pg_schema_lc = {k.lower(): v for k, v in pg_schema.items()}
     mysql_schema_lc = {k.lower(): v for k, v in mysql_schema.items()}
+    keys_lc = {k.lower(): v for k, v in (mysql_keys or {}).items()}
+    indexes_lc = {k.lower(): v for k, v in (pg_indexes or {}).items()}
 
-    missing_tables = []
-    table_diffs = {}
-
+    diff = SchemaDiff()
     for table_lc, mysql_columns in mysql_schema_lc.items():
         if table_lc not in pg_schema_lc:
-            missing_tables.append(table_lc)
+            diff.missing_tables.append(table_lc)
             continue
 
         pg_columns = {col["name"].lower(): col["type"] for col in pg_schema_lc[table_lc]}
-        missing_columns = []
-        mismatched_columns = []
+        table_diff = TableDiff(table_lc)
 
         for col in mysql_columns:
             name_lc = col["name"].lower()
             m_type = col["type"]
             if name_lc not in pg_columns:
-                missing_columns.append(col["name"])  # original name
+                table_diff.missing_columns.append(col["name"])  # original name
             else:
                 pg_type = pg_columns[name_lc]
                 if pg_type != m_type:
-                    compatible, reason = is_compatible(m_type, pg_type)
-                    mismatched_columns.append({
-                        "column": col["name"],
-                        "pg_type": pg_type,
-                        "mysql_type": m_type,
-                        "compatibility": reason
-                    })
-
-        if missing_columns or mismatched_columns:
-            table_diffs[table_lc] = {
-                "missing_columns": missing_columns,
-                "type_mismatches": mismatched_columns
-            }
-
-    return missing_tables, table_diffs
-
-def write_report(missing_tables, table_diffs, output_path):
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("🔍 MISSING TABLES:\n")
-        for t in sorted(missing_tables):
-            f.write(f"  - {t}\n")
-
-        f.write("\n🧩 COLUMN DIFFERENCES:\n")
-        for table in sorted(table_diffs.keys()):
-            diffs = table_diffs[table]
-            f.write(f"\n📦 Table: {table}\n")
-            if diffs["missing_columns"]:
-                f.write("  🚫 Missing Columns:\n")
-                for col in diffs["missing_columns"]:
-                    f.write(f"    - {col}\n")
-            if diffs["type_mismatches"]:
-                f.write("  ⚠️ Mismatched Types:\n")
-                for m in diffs["type_mismatches"]:
-                    f.write(f"    - {m['column']}: PG={m['pg_type']} | MySQL={m['mysql_type']} | Compatibility={m['compatibility']}\n")
+                    _, reason = is_compatible(m_type, pg_type)
+                    table_diff.type_mismatches.append(TypeMismatch(col["name"], m_type, pg_type, reason))
+
+        keys = keys_lc.get(table_lc)
+        if keys is not None and pg_indexes is not None:
+            table_diff.mysql_primary_key = [c.lower() for c in keys.get("primary_key", [])]
+            table_diff.pg_primary_key = pg_primary_key(pg_schema_lc[table_lc], indexes_lc.get(table_lc))
+            pg_index_columns = {tuple(c.lower() for c in i["columns"]) for i in indexes_lc.get(table_lc, [])}
+            table_diff.missing_indexes = [
+                i for i in keys.get("indexes", [])
+                if tuple(c.lower() for c in i["columns"]) not in pg_index_columns
+            ]
+
+        if not table_diff.is_empty():
+            diff.tables[table_lc] = table_diff
 
+    diff.missing_tables.sort()
+    return diff
+
+def compare_schemas(pg_schema, mysql_schema):
+    """Legacy (missing_tables, {table: {"missing_columns", "type_mismatches"}}) view of diff_schemas()."""
+    diff = diff_schemas(mysql_schema, pg_schema)
+    table_diffs = {
+        table: {
+            "missing_columns": d.missing_columns,
+            "type_mismatches": [{"column": m.column, "pg_type": m.pg_type, "mysql_type": m.mysql_type,
+                                 "compatibility": m.compatibility} for m in d.type_mismatches],
+        }
+        for table, d in diff.tables.items()
+    }
+    return diff.missing_tables, table_diffs
+
+# --- REPORTS ---
+def render_text(diff):
+    lines = ["🔍 MISSING TABLES:"]
+    lines += [f"  - {t}" for t in sorted(diff.missing_tables)]
+    lines.append("\n🧩 COLUMN DIFFERENCES:")
+    for table in sorted(diff.tables):
+        d = diff.tables[table]
+        lines.append(f"\n📦 Table: {table}")
+        if d.missing_columns:
+            lines.append("  🚫 Missing Columns:")
+            lines += [f"    - {col}" for col in d.missing_columns]
+        if d.type_mismatches:
+            lines.append("  ⚠️ Mismatched Types:")
+            lines += [f"    - {m.column}: PG={m.pg_type} | MySQL={m.mysql_type} | Compatibility={m.compatibility}"
+                      for m in d.type_mismatches]
+        if d.primary_key_differs:
+            lines.append(f"  🔑 Primary Key: PG={d.pg_primary_key or 'none'} | MySQL={d.mysql_primary_key}")
+        if d.missing_indexes:
+            lines.append("  📇 Missing Indexes:")
+            lines += [f"    - {i.get('name', '?')} ({', '.join(i['columns'])}){' UNIQUE' if i.get('unique') else ''}"
+                      for i in d.missing_indexes]
+    return "\n".join(lines) + "\n"
+
+def render_json(diff):
+    return json.dumps(diff.to_dict(), indent=2)
+
+def write_report(diff, output_path=OUTPUT_REPORT, json_path=None):
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(render_text(diff))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            f.write(render_json(diff))
     print(f"✅ Report saved to: {output_path}")
 
 if __name__ == "__main__":
-    pg_schema = load_schema(PG_FILE)
-    mysql_schema = load_schema(MYSQL_FILE)
-    missing_tables, table_diffs = compare_schemas(pg_schema, mysql_schema)
-    write_report(missing_tables, table_diffs, OUTPUT_REPORT)
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare the MySQL schema with accelo_tap")
+    parser.add_argument("--live", action="store_true", help="Read accelo_tap from the live catalog instead of the JSON export")
+    args = parser.parse_args()
+
+    mysql_schema, pg_schema, mysql_keys, pg_indexes = load_cached_schemas()
+    if args.live:
+        from pg_conn import get_pg_connection
+        conn = get_pg_connection()
+        pg_schema, pg_indexes = load_live_pg_schema(conn.cursor())
+        conn.close()
+    diff = diff_schemas(mysql_schema, pg_schema, mysql_keys, pg_indexes or None)
+    write_report(diff, OUTPUT_REPORT, OUTPUT_JSON_REPORT)
@@ -1,164 +1,338 @@
+import re
 import json
-import subprocess
-import shutil
-import psycopg2
-from tqdm import tqdm
+import argparse
 from pg_conn import get_pg_connection
+from compare_db import diff_schemas, load_live_pg_schema, load_optional, write_report, MYSQL_KEYS_FILE
 
 # --- CONFIG ---
-PG_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_pg_schema.json"
 MYSQL_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_mysql_schema.json"
 SCHEMA_DIFF_REPORT_PATH = "C:/polaris_sync_agent/sync_tables/schema_diff_report.txt"
 BACKUP_BEFORE = "C:/polaris_sync_agent/sync_tables/schema_diff_report_before.txt"
 BACKUP_AFTER = "C:/polaris_sync_agent/sync_tables/schema_diff_report_after.txt"
-COMPARE_SCRIPT = "C:/polaris_sync_agent/sync_tables/compare_db.py"
 LOG_PATH = "C:/polaris_sync_agent/sync_tables/create_missing_tables.log"
+LOCK_TIMEOUT = "5s"   # fail fast instead of queueing behind readers while holding ACCESS EXCLUSIVE
+WIDEN_INTEGERS = False  # retype existing integer columns to the wider unsigned mapping (full table rewrite)
+
+# mysql_to_pg_type() spellings -> the names the catalog reports (format_type)
+PG_TYPE_ALIASES = {
+    "int": "integer",
+    "int4": "integer",
+    "varchar": "character varying",
+    "char": "character",
+    "bpchar": "character",
+    "timestamp": "timestamp without time zone",
+    "decimal": "numeric",
+    "float8": "double precision",
+    "float4": "real",
+    "bool": "boolean",
+    "time": "time without time zone",
+}
+
+# Integer widths, narrowest first (mysql_to_pg_type() widens unsigned columns one step)
+INTEGER_RANK = {"smallint": 1, "int2": 1, "integer": 2, "bigint": 3, "int8": 3, "numeric(20,0)": 4}
 
 # --- Helpers ---
+_MYSQL_TYPE = re.compile(r"^(\w+)(?:\(([^)]*)\))?(\s+unsigned)?")
+
 def mysql_to_pg_type(mysql_type):
-    mysql_type = mysql_type.lower()
-    if mysql_type.startswith("int"):
-        return "INTEGER"
-    elif mysql_type.startswith("tinyint(1)"):
-        return "BOOLEAN"
-    elif mysql_type.startswith("bigint"):
-        return "BIGINT"
-    elif mysql_type.startswith("smallint"):
-        return "SMALLINT"
-    elif mysql_type.startswith("varchar"):
-        return "VARCHAR"
-    elif mysql_type.startswith("char"):
-        return "CHAR"
-    elif mysql_type in ["text", "mediumtext"]:
+    """Map a MySQL column definition ("int(11) unsigned NOT NULL", ...) to a PostgreSQL type.
+
+    Unsigned integers widen so every MySQL value fits; lengths and precision carry over.
+    """
+    match = _MYSQL_TYPE.match(mysql_type.strip().lower())
+    if not match:
         return "TEXT"
-    elif mysql_type.startswith("enum("):
+    base, params, unsigned = match.group(1), match.group(2), bool(match.group(3))
+
+    if base == "tinyint":
+        return "BOOLEAN" if params == "1" else "SMALLINT"
+    if base == "smallint":
+        return "INTEGER" if unsigned else "SMALLINT"
+    if base == "mediumint":
+        return "INTEGER"
+    if base in ("int", "integer"):
+        return "BIGINT" if unsigned else "INTEGER"
+    if base == "bigint":
+        return "NUMERIC(20,0)" if unsigned else "BIGINT"
+    if base == "varchar":
+        return f"VARCHAR({params})" if params else "VARCHAR"
+    if base == "char":
+        return f"CHAR({params})" if params else "CHAR"
+    if base in ("text", "tinytext", "mediumtext", "longtext", "enum", "set"):
         return "TEXT"
-    elif mysql_type in ["datetime", "timestamp"]:
+    if base in ("datetime", "timestamp"):
         return "TIMESTAMP"
-    elif mysql_type.startswith("decimal"):
-        return "DECIMAL"
-    elif mysql_type.startswith("double"):
+    if base == "date":
+        return "DATE"
+    if base == "time":
+        return "TIME"
+    if base == "year":
+        return "SMALLINT"
+    if base in ("decimal", "numeric"):
+        return f"NUMERIC({params})" if params else "NUMERIC"
+    if base in ("double", "real"):
         return "DOUBLE PRECISION"
-    elif mysql_type.startswith("float"):
+    if base == "float":
         return "REAL"
-    elif mysql_type.startswith("date"):
-        return "DATE"
+    if base in ("blob", "tinyblob", "mediumblob", "longblob", "binary", "varbinary"):
+        return "BYTEA"
+    if base == "json":
+        return "JSONB"
+    if base == "bit":
+        return "BOOLEAN" if params in (None, "1") else "BIGINT"
     return "TEXT"
 
-def run_compare_script():
-    subprocess.run(["python", COMPARE_SCRIPT], check=True)
+def normalize_pg_type(pg_type):
+    base = pg_type.lower().split("(", 1)[0].strip()
+    return PG_TYPE_ALIASES.get(base, base)
+
+def is_integer_widening(current, target):
+    """True if target only widens the integer column current (int -> bigint etc.)."""
+    rank = INTEGER_RANK.get(normalize_pg_type(current))
+    wider = INTEGER_RANK.get(target.lower().replace(" ", ""))
+    return rank is not None and wider is not None and wider > rank
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def get_table_diffs(report_path):
-    diffs = {}
-    current_table = None
-    section = None
-    with open(report_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith("📦 Table: "):
-                current_table = line.replace("📦 Table: ", "").strip().lower()
-                diffs[current_table] = {"missing_columns": [], "type_mismatches": []}
-            elif line.startswith("🚫 Missing Columns"):
-                section = "missing"
-            elif line.startswith("⚠️ Mismatched Types"):
-                section = "mismatch"
-            elif line.startswith("-"):
-                if section == "missing":
-                    diffs[current_table]["missing_columns"].append(line.strip("- "))
-                elif section == "mismatch":
-                    col = line.strip("- ").split(":")[0].strip()
-                    diffs[current_table]["type_mismatches"].append(col)
-    return diffs
+def load_live_schema(conn):
+    """Live accelo_tap columns and indexes, table names lower-cased."""
+    cursor = conn.cursor()
+    pg_schema, pg_indexes = load_live_pg_schema(cursor)
+    cursor.close()
+    conn.rollback()
+    return {k.lower(): v for k, v in pg_schema.items()}, pg_indexes
 
-# --- MAIN ---
-def create_and_update_tables():
-    run_compare_script()
-    shutil.copyfile(SCHEMA_DIFF_REPORT_PATH, BACKUP_BEFORE)
+# --- PLANNER ---
+def index_name(table, key_name):
+    return f"{table}_{key_name}"[:63]
 
-    mysql_schema = {k.lower(): v for k, v in load_json(MYSQL_SCHEMA_PATH).items()}
-    pg_schema = {k.lower(): v for k, v in load_json(PG_SCHEMA_PATH).items()}
-    diffs = get_table_diffs(SCHEMA_DIFF_REPORT_PATH)
+def key_ddl(table, keys, existing=()):
+    """(constraint clauses, CREATE INDEX statements) for MySQL keys not yet covered in PostgreSQL.
 
-    conn = get_pg_connection()
-    cursor = conn.cursor()
+    `existing` holds the column tuples (lower-case) already indexed on the live table.
+    """
+    existing = set(existing)
+    clauses, statements = [], []
+    for index in keys.get("indexes", []):
+        columns = tuple(c.lower() for c in index["columns"])
+        if columns in existing:
+            continue
+        existing.add(columns)
+        cols = ", ".join(f'"{c}"' for c in index["columns"])
+        name = index_name(table, index["name"] or "_".join(index["columns"]))
+        if index["unique"]:
+            clauses.append(f'ADD CONSTRAINT "{name}" UNIQUE ({cols})')
+        else:
+            statements.append(f'CREATE INDEX IF NOT EXISTS "{name}" ON accelo_tap."{table}" ({cols})')
+    return clauses, statements
+
+def plan_reconciliation(mysql_schema, pg_schema, mysql_keys=None, pg_indexes=None, widen_integers=WIDEN_INTEGERS):
+    """Compute the real delta between the MySQL schema and the live accelo_tap catalog.
+
+    Returns steps {"table", "statements", "created", "added", "retyped", "keys"}. A new
+    table gets one step: CREATE TABLE with its keys, then CREATE INDEX statements. An
+    existing table gets a single ALTER TABLE carrying every ADD COLUMN / ALTER COLUMN
+    TYPE clause, then a separate "keys_only" step with its missing constraints and
+    indexes. Existing integer columns are only widened to the unsigned mapping when
+    widen_integers is set, since each one rewrites the whole table.
+    """
+    mysql_keys = {k.lower(): v for k, v in (mysql_keys or {}).items()}
+    pg_indexes = {k.lower(): v for k, v in (pg_indexes or {}).items()}
+    plan = []
+    for table, columns in sorted(mysql_schema.items()):
+        if not columns:
+            continue
+        keys = mysql_keys.get(table, {})
+        primary_key = keys.get("primary_key", [])
+
+        if table not in pg_schema:
+            col_defs = [f'"{col["name"]}" {mysql_to_pg_type(col["type"])}' for col in columns]
+            if primary_key:
+                col_defs.append("PRIMARY KEY (" + ", ".join(f'"{c}"' for c in primary_key) + ")")
+            clauses, statements = key_ddl(table, keys, [tuple(c.lower() for c in primary_key)])
+            col_defs += [c[len("ADD "):] for c in clauses]
+            plan.append({
+                "table": table,
+                "statements": [f'CREATE TABLE IF NOT EXISTS accelo_tap."{table}" (\n  ' + ",\n  ".join(col_defs) + "\n)"]
+                              + statements,
+                "created": True, "added": [], "retyped": [], "keys": len(clauses) + len(statements) + bool(primary_key),
+            })
+            continue
+
+        live = {col["name"].lower(): col["type"] for col in pg_schema[table]}
+        live_indexes = pg_indexes.get(table, [])
+        has_primary = any(i.get("primary") for i in live_indexes) or any(c.get("primary_key") for c in pg_schema[table])
+        clauses, added, retyped = [], [], []
+        for col in columns:
+            name = col["name"]
+            target = mysql_to_pg_type(col["type"])
+            current = live.get(name.lower())
+            if current is None:
+                clauses.append(f'ADD COLUMN IF NOT EXISTS "{name}" {target}')
+                added.append(name)
+            elif normalize_pg_type(current) != normalize_pg_type(target):
+                if not widen_integers and is_integer_widening(current, target):
+                    continue
+                clauses.append(f'ALTER COLUMN "{name}" TYPE {target} USING "{name}"::{target}')
+                retyped.append(f"{name}: {current} -> {target}")
+
+        if clauses:
+            plan.append({
+                "table": table,
+                "statements": [f'ALTER TABLE accelo_tap."{table}"\n  ' + ",\n  ".join(clauses)],
+                "created": False, "added": added, "retyped": retyped, "keys": 0,
+            })
+
+        # Keys go in a step of their own: rows loaded before the keys existed may hold
+        # duplicates, and a failed constraint must not undo the column changes above.
+        key_clauses = []
+        if primary_key and not has_primary:
+            key_clauses.append("ADD PRIMARY KEY (" + ", ".join(f'"{c}"' for c in primary_key) + ")")
+        existing = [tuple(c.lower() for c in i["columns"]) for i in live_indexes]
+        if primary_key:
+            existing.append(tuple(c.lower() for c in primary_key))
+        unique_clauses, statements = key_ddl(table, keys, existing)
+        key_clauses += unique_clauses
+        if key_clauses or statements:
+            plan.append({
+                "table": table,
+                "statements": [f'ALTER TABLE accelo_tap."{table}" {clause}' for clause in key_clauses] + statements,
+                "created": False, "added": [], "retyped": [], "keys": len(key_clauses) + len(statements),
+                "keys_only": True,
+            })
+    return plan
 
-    created = []
-    added_cols = []
-    fixed_types = []
+def run_step(cursor, step, failed, log=None):
+    """Execute one step inside the current transaction.
+
+    Statements of a keys-only step each run under a savepoint, so a key that cannot be
+    built (e.g. duplicate rows) is reported on its own and the rest still apply.
+    Returns the number of statements that failed this way.
+    """
+    if not step.get("keys_only"):
+        for statement in step["statements"]:
+            cursor.execute(statement)
+        return 0
+    errors = 0
+    for statement in step["statements"]:
+        cursor.execute("SAVEPOINT reconcile_key")
+        try:
+            cursor.execute(statement)
+            cursor.execute("RELEASE SAVEPOINT reconcile_key")
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT reconcile_key")
+            errors += 1
+            failed.append((step["table"], str(e)))
+            if log:
+                log.write(f"❌ {step['table']}: {e}\n")
+    return errors
+
+def apply_plan(conn, plan, single_transaction=False, log=None):
+    """Run the plan; returns the list of (table, error) failures.
+
+    Per-table mode commits each step on its own so one failure does not undo the rest;
+    single-transaction mode applies every column change or none. In both modes a key
+    that cannot be built is reported without undoing anything else.
+    """
+    cursor = conn.cursor()
     failed = []
+    try:
+        if single_transaction:
+            cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            try:
+                for step in plan:
+                    errors = run_step(cursor, step, failed, log)
+                    if log and errors < len(step["statements"]):
+                        log.write(f"✅ {step['table']}: {describe_step(step, errors)}\n")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                failed.append((step["table"], str(e)))
+                if log:
+                    log.write(f"❌ {step['table']}: {e} (whole plan rolled back)\n")
+            return failed
 
-    with open(LOG_PATH, "w", encoding="utf-8") as log:
-        # --- Create any fully missing tables ---
-        missing_tables = [t for t in mysql_schema if t not in pg_schema]
-        for table in tqdm(missing_tables, desc="Creating missing tables"):
+        for step in plan:
             try:
-                columns = mysql_schema.get(table, [])
-                if not columns:
-                    log.write(f"⚠️ Skipped empty definition: {table}\n")
-                    continue
-                col_defs = [f'"{col["name"]}" {mysql_to_pg_type(col["type"])}' for col in columns]
-                sql = f'CREATE TABLE IF NOT EXISTS accelo_tap."{table}" (\n  ' + ",\n  ".join(col_defs) + "\n);"
-                cursor.execute(sql)
+                cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                errors = run_step(cursor, step, failed, log)
                 conn.commit()
-                created.append(table)
-                log.write(f"✅ Created table: {table}\n")
+                if log and errors < len(step["statements"]):
+                    log.write(f"✅ {step['table']}: {describe_step(step, errors)}\n")
             except Exception as e:
                 conn.rollback()
-                failed.append((table, str(e)))
-                log.write(f"❌ Failed to create table {table}: {e}\n")
-
-        # --- Force-add all missing columns from MySQL schema ---
-        for table, columns in tqdm(mysql_schema.items(), desc="Ensuring all columns"):
-            for col in columns:
-                col_name = col["name"]
-                col_type = mysql_to_pg_type(col["type"])
-                try:
-                    alter_sql = f'ALTER TABLE accelo_tap."{table}" ADD COLUMN IF NOT EXISTS "{col_name}" {col_type};'
-                    cursor.execute(alter_sql)
-                    conn.commit()
-                    added_cols.append(f"{table}.{col_name}")
-                    log.write(f"🛠️ Ensured column: {table}.{col_name}\n")
-                except Exception as e:
-                    conn.rollback()
-                    failed.append((table, col_name, str(e)))
-                    log.write(f"❌ Failed to add column {table}.{col_name}: {e}\n")
-
-        # --- Handle type mismatches explicitly ---
-        for table, detail in tqdm(diffs.items(), desc="Fixing type mismatches"):
-            for col_name in detail.get("type_mismatches", []):
-                match = next((c for c in mysql_schema.get(table, []) if c["name"] == col_name), None)
-                if not match:
-                    log.write(f"⚠️ No definition found for type mismatch {col_name} in {table}\n")
-                    continue
-                pg_type = mysql_to_pg_type(match["type"])
-                try:
-                    alter_type_sql = f'ALTER TABLE accelo_tap."{table}" ALTER COLUMN "{col_name}" TYPE {pg_type};'
-                    cursor.execute(alter_type_sql)
-                    conn.commit()
-                    fixed_types.append(f"{table}.{col_name}")
-                    log.write(f"🔁 Fixed type: {table}.{col_name} to {pg_type}\n")
-                except Exception as e:
-                    conn.rollback()
-                    failed.append((table, col_name, str(e)))
-                    log.write(f"❌ Failed to alter type {table}.{col_name}: {e}\n")
+                failed.append((step["table"], str(e)))
+                if log:
+                    log.write(f"❌ {step['table']}: {e}\n")
+        return failed
+    finally:
+        cursor.close()
 
-    cursor.close()
-    conn.close()
+def describe_step(step, errors=0):
+    if step["created"]:
+        return f"created with {step['keys']} keys" if step["keys"] else "created"
+    parts = []
+    if step["added"]:
+        parts.append(f"added {', '.join(step['added'])}")
+    if step["retyped"]:
+        parts.append(f"retyped {'; '.join(step['retyped'])}")
+    if step["keys"]:
+        parts.append(f"{step['keys'] - errors} keys")
+    return " | ".join(parts)
 
-    run_compare_script()
-    shutil.copyfile(SCHEMA_DIFF_REPORT_PATH, BACKUP_AFTER)
+# --- MAIN ---
+def create_and_update_tables(dry_run=False, single_transaction=False, widen_integers=WIDEN_INTEGERS):
+    mysql_schema = {k.lower(): v for k, v in load_json(MYSQL_SCHEMA_PATH).items()}
+
+    mysql_keys = load_optional(MYSQL_KEYS_FILE)
+
+    conn = get_pg_connection()
+    pg_schema, pg_indexes = load_live_schema(conn)
+
+    plan = plan_reconciliation(mysql_schema, pg_schema, mysql_keys, pg_indexes, widen_integers)
+    created = [s["table"] for s in plan if s["created"]]
+    tables = len({s["table"] for s in plan})
+    added = sum(len(s["added"]) for s in plan)
+    retyped = sum(len(s["retyped"]) for s in plan)
+    keys = sum(s["keys"] for s in plan)
+
+    if dry_run:
+        for step in plan:
+            for statement in step["statements"]:
+                print(statement + ";\n")
+        print(f"-- {tables} tables: {len(created)} new, {added} new columns, {retyped} type changes, {keys} keys/indexes")
+        conn.close()
+        return plan
+
+    write_report(diff_schemas(mysql_schema, pg_schema, mysql_keys, pg_indexes), BACKUP_BEFORE)
+
+    with open(LOG_PATH, "w", encoding="utf-8") as log:
+        failed = apply_plan(conn, plan, single_transaction, log)
+
+    pg_schema, pg_indexes = load_live_schema(conn)
+    conn.close()
+    after = diff_schemas(mysql_schema, pg_schema, mysql_keys, pg_indexes)
+    write_report(after, BACKUP_AFTER)
+    write_report(after, SCHEMA_DIFF_REPORT_PATH)
 
     print("\n✅ Done.")
     print(f"🆕 Tables created: {len(created)}")
-    print(f"🛠️ Columns added: {len(added_cols)}")
-    print(f"🔁 Types fixed: {len(fixed_types)}")
+    print(f"🛠️ Columns added: {added}")
+    print(f"🔁 Types fixed: {retyped}")
+    print(f"🔑 Keys/indexes added: {keys}")
     print(f"❌ Failures: {len(failed)}")
     print(f"📄 See log: {LOG_PATH}")
+    return plan
 
 # --- ENTRY ---
 if __name__ == "__main__":
-    create_and_update_tables()
+    parser = argparse.ArgumentParser(description="Bring accelo_tap in line with the MySQL schema")
+    parser.add_argument("--dry-run", action="store_true", help="Print the planned SQL without running it")
+    parser.add_argument("--single-transaction", action="store_true",
+                        help="Apply every table's change in one transaction (all or nothing)")
+    parser.add_argument("--widen-integers", action="store_true",
+                        help="Also retype existing integer columns to the wider unsigned mapping (rewrites those tables)")
+    args = parser.parse_args()
+    create_and_update_tables(args.dry_run, args.single_transaction, args.widen_integers)
@@ -0,0 +1,172 @@
+import json
+import hashlib
+import logging
+from itertools import groupby
+from operator import itemgetter
+from psycopg2.extras import execute_values
+from pg_conn import iter_pg_rows
+from dump_lexer import iter_dump_rows
+from row_codec import get_row_codec
+
+# --- CONFIG ---
+MYSQL_KEYS_PATH = "C:/polaris_sync_agent/sync_tables/accelo_mysql_keys.json"
+HASH_INDEX_TABLE = "accelo_monitor.row_hash_index"
+UPSERT_BATCH_ROWS = 1000
+KEY_SEPARATOR = "\x1f"
+
+_primary_keys = None
+
+
+class DeltaSyncError(RuntimeError):
+    pass
+
+
+# --- KEYS & HASHES ---
+def get_primary_key(table):
+    """Primary key columns of a MySQL table, from parse_mysql_schema.py's keys export."""
+    global _primary_keys
+    if _primary_keys is None:
+        with open(MYSQL_KEYS_PATH, "r", encoding="utf-8") as f:
+            _primary_keys = {k.lower(): v.get("primary_key", []) for k, v in json.load(f).items()}
+    return _primary_keys.get(table.lower(), [])
+
+
+def row_key(values):
+    return KEY_SEPARATOR.join("" if v is None else str(v) for v in values)
+
+
+def row_hash(row):
+    """Stable hash of a raw dump row (the lexer tuple, before any type casting)."""
+    return hashlib.blake2b(repr(row).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def ensure_hash_index(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {HASH_INDEX_TABLE} (
+            table_name TEXT NOT NULL,
+            pk TEXT NOT NULL,
+            row_hash TEXT NOT NULL,
+            PRIMARY KEY (table_name, pk)
+        )
+    """)
+
+
+def has_unique_key(cursor, table, pk_columns):
+    """True if accelo_tap.<table> has a unique index on exactly pk_columns (needed by ON CONFLICT)."""
+    cursor.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'accelo_tap' AND c.relname = %s AND i.indisunique
+          AND (SELECT array_agg(a.attname::text ORDER BY a.attname)
+               FROM pg_attribute a
+               WHERE a.attrelid = c.oid AND a.attnum = ANY(i.indkey)) = %s
+        LIMIT 1
+    """, (table, sorted(pk_columns)))
+    return cursor.fetchone() is not None
+
+
+def load_hash_index(cursor, table, pk_columns):
+    """Return {pk: row_hash} for a table.
+
+    On the first delta run the index is empty, so it is seeded from the keys already in
+    accelo_tap (with no hash) to let rows missing from the dump be deleted. That seed
+    read streams through a server-side cursor instead of fetching the whole table.
+    """
+    cursor.execute(f"SELECT pk, row_hash FROM {HASH_INDEX_TABLE} WHERE table_name = %s", (table,))
+    index = dict(cursor.fetchall())
+    if not index:
+        cols = ', '.join(f'"{c}"' for c in pk_columns)
+        index = {row_key(r): None for r in iter_pg_rows(f'SELECT {cols} FROM accelo_tap."{table}"')}
+    return index
+
+
+# --- APPLY ---
+def upsert_rows(cursor, table, columns, pk_columns, rows):
+    cols = ', '.join(f'"{c}"' for c in columns)
+    conflict = ', '.join(f'"{c}"' for c in pk_columns)
+    updates = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in columns if c not in pk_columns)
+    action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    sql = f'INSERT INTO accelo_tap."{table}" ({cols}) VALUES %s ON CONFLICT ({conflict}) {action}'
+    execute_values(cursor, sql, rows, page_size=UPSERT_BATCH_ROWS)
+
+
+def delete_rows(cursor, table, pk_columns, keys):
+    """Delete rows by key through a temp staging table joined on the primary key."""
+    cols = ', '.join(f'"{c}"' for c in pk_columns)
+    cursor.execute("DROP TABLE IF EXISTS delta_delete_stage")
+    cursor.execute(f'CREATE TEMP TABLE delta_delete_stage AS SELECT {cols} FROM accelo_tap."{table}" WITH NO DATA')
+    stage_rows = [[None if v == "" else v for v in key.split(KEY_SEPARATOR)] for key in keys]
+    execute_values(cursor, f"INSERT INTO delta_delete_stage ({cols}) VALUES %s", stage_rows, page_size=UPSERT_BATCH_ROWS)
+    join = ' AND '.join(f't."{c}" = s."{c}"' for c in pk_columns)
+    cursor.execute(f'DELETE FROM accelo_tap."{table}" t USING delta_delete_stage s WHERE {join}')
+    cursor.execute("DROP TABLE delta_delete_stage")
+
+
+def save_hash_index(cursor, table, changed, deleted_keys):
+    if changed:
+        execute_values(cursor, f"""
+            INSERT INTO {HASH_INDEX_TABLE} (table_name, pk, row_hash) VALUES %s
+            ON CONFLICT (table_name, pk) DO UPDATE SET row_hash = EXCLUDED.row_hash
+        """, [(table, key, h) for key, h in changed.items()], page_size=UPSERT_BATCH_ROWS)
+    if deleted_keys:
+        cursor.execute(f"DELETE FROM {HASH_INDEX_TABLE} WHERE table_name = %s AND pk = ANY(%s)",
+                       (table, list(deleted_keys)))
+
+
+def delta_sync_table(table, file_path, col_defs, cursor):
+    """Apply only the inserted, updated and deleted rows of a dump file to accelo_tap.<table>.
+
+    Each dump row is hashed and compared against the stored hash index, keyed by the
+    MySQL primary key. Returns {"inserted", "updated", "deleted", "unchanged"} counts.
+    The caller commits.
+    """
+    pk_columns = get_primary_key(table)
+    if not pk_columns:
+        raise DeltaSyncError(f"No primary key known for {table}; re-run parse_mysql_schema.py")
+    if not has_unique_key(cursor, table, pk_columns):
+        raise DeltaSyncError(f"accelo_tap.{table} has no unique index on {pk_columns}")
+
+    ensure_hash_index(cursor)
+    index = load_hash_index(cursor, table, pk_columns)
+    seen = set()
+    changed = {}
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    default_columns = [c["name"] for c in col_defs]
+    for columns, group in groupby(iter_dump_rows(file_path), key=itemgetter(1)):
+        insert_columns = columns if columns is not None else default_columns
+        missing = [c for c in pk_columns if c not in insert_columns]
+        if missing:
+            raise DeltaSyncError(f"INSERT for {table} does not carry primary key columns {missing}")
+        pk_idx = [insert_columns.index(c) for c in pk_columns]
+        _, codec = get_row_codec(table, insert_columns, col_defs)
+
+        pending = []
+        for _, _, raw in group:
+            key = row_key([raw[i] for i in pk_idx])
+            seen.add(key)
+            digest = row_hash(raw)
+            previous = index.get(key, False)
+            if previous == digest:
+                counts["unchanged"] += 1
+                continue
+            counts["inserted" if previous is False else "updated"] += 1
+            changed[key] = digest
+            pending.append(codec(raw))
+            if len(pending) >= UPSERT_BATCH_ROWS:
+                upsert_rows(cursor, table, insert_columns, pk_columns, pending)
+                pending = []
+        if pending:
+            upsert_rows(cursor, table, insert_columns, pk_columns, pending)
+
+    stale = index.keys() - seen
+    if stale:
+        delete_rows(cursor, table, pk_columns, stale)
+    counts["deleted"] = len(stale)
+    save_hash_index(cursor, table, changed, stale)
+
+    logging.info(f"Delta {table}: {counts['inserted']} inserted, {counts['updated']} updated, "
+                 f"{counts['deleted']} deleted, {counts['unchanged']} unchanged")
+    return counts
@@ -0,0 +1,196 @@
+import os
+import re
+
+# --- CONFIG ---
+CHUNK_SIZE = 1 << 20           # bytes pulled from the stream per read
+MAX_PENDING_BYTES = 1 << 30    # one token may not exceed mysqldump's max_allowed_packet
+DECODE_ERRORS = "ignore"
+
+# --- TOKENS ---
+_INSERT_HEADER = re.compile(
+    rb"^INSERT\s+(?:IGNORE\s+)?INTO\s+[`\"]?(\w+)[`\"]?\s*(?:\(([^)]*)\))?\s*VALUES",
+    re.IGNORECASE | re.MULTILINE,
+)
+_INSERT_LINE = b"\nINSERT INTO "
+_ROW_OPEN = re.compile(rb"\s*\(")
+_ROW_CLOSE = re.compile(rb"\s*([,;])")
+_QUOTED = rb"'(?P<%s>[^'\\]*(?:(?:\\.|'')[^'\\]*)*)'"
+_VALUE = re.compile(
+    rb"\s*(?:"
+    + _QUOTED % b"str"
+    + rb"|(?P<null>NULL)"
+    + rb"|(?P<num>[-+]?[0-9.][0-9.eE+-]*)"
+    + rb"|_binary\s*" + _QUOTED % b"bin"
+    + rb"|0x(?P<hex>[0-9A-Fa-f]*)"
+    + rb"|[xX]'(?P<xhex>[0-9A-Fa-f]*)'"
+    + rb"|[bB]'(?P<bits>[01]*)'"
+    + rb")\s*[,)]",
+    re.DOTALL,
+)
+_ESCAPE = re.compile(rb"\\(.)|''", re.DOTALL)
+_ESCAPES = {b"0": b"\0", b"b": b"\b", b"n": b"\n", b"r": b"\r", b"t": b"\t", b"Z": b"\x1a",
+            b"%": b"\\%", b"_": b"\\_"}
+_CLOSE_PAREN = ord(")")
+_SEMICOLON = ord(";")
+
+
+class DumpSyntaxError(ValueError):
+    pass
+
+
+def _unescape_match(m):
+    char = m.group(1)
+    if char is None:
+        return b"'"
+    return _ESCAPES.get(char, char)
+
+
+def unescape(raw):
+    """Undo mysqldump string escaping (backslash sequences and doubled quotes)."""
+    if b"\\" not in raw and b"''" not in raw:
+        return raw
+    return _ESCAPE.sub(_unescape_match, raw)
+
+
+def iter_insert_rows(stream, chunk_size=CHUNK_SIZE, end=None):
+    """Yield (table, columns, row) for every row of every INSERT in a binary mysqldump stream.
+
+    `columns` is None when the statement has no column list and is the same list
+    object for every row of one statement. Row values are str for quoted strings,
+    the literal text for numbers, None for NULL, bytes for _binary/hex literals and
+    int for b'' bit literals; the caller casts them to the target types.
+
+    With `end` set, reading stops at the first INSERT that starts `end` or more bytes
+    past the stream's initial position (see split_insert_ranges).
+    """
+    buf = b""
+    pos = 0
+    base = 0  # stream offset of buf[0], relative to where reading started
+    eof = False
+
+    def refill():
+        nonlocal buf, pos, base, eof
+        if eof:
+            return False
+        if len(buf) - pos > MAX_PENDING_BYTES:
+            raise DumpSyntaxError(f"Unterminated token after {MAX_PENDING_BYTES} bytes")
+        chunk = stream.read(chunk_size)
+        buf = buf[pos:] + chunk
+        base += pos
+        pos = 0
+        eof = not chunk
+        return not eof
+
+    value_match = _VALUE.match
+    decode_errors = DECODE_ERRORS
+
+    while True:
+        header = _INSERT_HEADER.search(buf, pos)
+        if header is None:
+            # Keep the last partial line so a header split across reads is still found.
+            cut = buf.rfind(b"\n", pos)
+            if cut >= 0:
+                pos = cut + 1
+            if not refill():
+                return
+            continue
+        if end is not None and base + header.start() >= end:
+            return
+
+        table = header.group(1).decode("ascii")
+        col_blob = header.group(2)
+        columns = None
+        if col_blob is not None:
+            columns = [c.strip(b' `"\r\n\t').decode("utf-8") for c in col_blob.split(b",")]
+        pos = header.end()
+
+        while True:
+            m = _ROW_OPEN.match(buf, pos)
+            if m is None:
+                if refill():
+                    continue
+                raise DumpSyntaxError(f"Expected '(' in INSERT for {table}")
+            pos = m.end()
+
+            row = []
+            while True:
+                m = value_match(buf, pos)
+                if m is None:
+                    if refill():
+                        continue
+                    raise DumpSyntaxError(f"Malformed value in INSERT for {table}")
+                pos = m.end()
+                kind = m.lastindex
+                if kind == 1:
+                    raw = m.group(1)
+                    if b"\\" in raw or b"''" in raw:
+                        raw = _ESCAPE.sub(_unescape_match, raw)
+                    row.append(raw.decode("utf-8", decode_errors))
+                elif kind == 3:
+                    row.append(m.group(3).decode("ascii"))
+                elif kind == 2:
+                    row.append(None)
+                elif kind == 4:
+                    row.append(unescape(m.group(4)))
+                elif kind == 7:
+                    row.append(int(m.group(7) or b"0", 2))
+                else:
+                    row.append(bytes.fromhex(m.group(kind).decode("ascii")))
+                if buf[pos - 1] == _CLOSE_PAREN:
+                    break
+
+            yield table, columns, tuple(row)
+
+            m = _ROW_CLOSE.match(buf, pos)
+            while m is None:
+                if not refill():
+                    raise DumpSyntaxError(f"Unterminated INSERT for {table}")
+                m = _ROW_CLOSE.match(buf, pos)
+            pos = m.end()
+            if buf[pos - 1] == _SEMICOLON:
+                break
+
+
+def iter_dump_rows(file_path, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """Open a .sql dump file and stream the INSERT rows that start in [start, end)."""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        yield from iter_insert_rows(f, chunk_size, None if end is None else end - start)
+
+
+def split_insert_ranges(file_path, chunk_bytes):
+    """Cut a dump file into (start, end) byte ranges of roughly chunk_bytes each.
+
+    Every cut lands on the start of an `INSERT INTO` line, so each range holds whole
+    statements. mysqldump escapes newlines inside strings, so a line break followed
+    by INSERT INTO only ever occurs between statements.
+    """
+    size = os.path.getsize(file_path)
+    cuts = [0]
+    with open(file_path, "rb") as f:
+        target = chunk_bytes
+        while target < size:
+            cut = _next_insert_offset(f, target)
+            if cut is None:
+                break
+            if cut > cuts[-1]:
+                cuts.append(cut)
+            target = max(cut, target) + chunk_bytes
+    cuts.append(size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def _next_insert_offset(f, offset):
+    """Offset of the first INSERT line starting after `offset`, or None."""
+    f.seek(offset)
+    carry = b""
+    while True:
+        block = f.read(CHUNK_SIZE)
+        if not block:
+            return None
+        data = carry + block
+        idx = data.find(_INSERT_LINE)
+        if idx >= 0:
+            return offset - len(carry) + idx + 1
+        carry = data[-(len(_INSERT_LINE) - 1):]
+        offset += len(block)
@@ -1,60 +1,93 @@
-import os
 import json
-import psycopg2
-from psycopg2 import sql
-from dotenv import load_dotenv
-
-load_dotenv()
+from pg_conn import get_pg_connection
 
 OUTPUT_FILE = "accelo_pg_schema.json"
+OUTPUT_INDEX_FILE = "accelo_pg_indexes.json"
 SCHEMA_NAME = "accelo_tap"
 
-def get_pg_connection():
-    return psycopg2.connect(
-        dbname=os.getenv("DBNAME"),
-        user=os.getenv("DBUSER"),
-        password=os.getenv("DBPASSWORD"),
-        host=os.getenv("DBHOST"),
-        port=os.getenv("DBPORT")
-    )
+# format_type(atttypid, NULL) gives the same names as information_schema.columns.data_type
+# for the types we use ("character varying", "timestamp without time zone", ...).
+COLUMNS_QUERY = """
+    SELECT c.relname, a.attname, format_type(a.atttypid, NULL), NOT a.attnotnull,
+           pg_get_expr(d.adbin, d.adrelid), COALESCE(a.attnum = ANY(pk.conkey), false)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    LEFT JOIN pg_constraint pk ON pk.conrelid = c.oid AND pk.contype = 'p'
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname, a.attnum
+"""
 
-def get_schema_structure():
-    conn = get_pg_connection()
-    cursor = conn.cursor()
+INDEXES_QUERY = """
+    SELECT t.relname, i.relname, ix.indisunique, ix.indisprimary,
+           ARRAY(SELECT a.attname::text
+                 FROM unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                 JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+                 ORDER BY k.ord)
+    FROM pg_index ix
+    JOIN pg_class t ON t.oid = ix.indrelid
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = %s AND t.relkind IN ('r', 'p')
+    ORDER BY t.relname, i.relname
+"""
 
-    # Fetch all table names
-    cursor.execute(sql.SQL("""
-        SELECT table_name
-        FROM information_schema.tables
-        WHERE table_schema = %s AND table_type = 'BASE TABLE'
-        ORDER BY table_name
-    """), [SCHEMA_NAME])
-    
-    tables = cursor.fetchall()
-    schema = {}
+def get_schema_structure(cursor=None):
+    """{table: [{"name", "type", "nullable", "default", "primary_key"}]} from one catalog query."""
+    conn = None
+    if cursor is None:
+        conn = get_pg_connection()
+        cursor = conn.cursor()
 
-    for (table_name,) in tables:
-        cursor.execute(sql.SQL("""
-            SELECT column_name, data_type
-            FROM information_schema.columns
-            WHERE table_schema = %s AND table_name = %s
-            ORDER BY ordinal_position
-        """), [SCHEMA_NAME, table_name])
-        
-        columns = cursor.fetchall()
-        schema[table_name] = [
-            {"name": col[0], "type": col[1]} for col in columns
-        ]
+    cursor.execute(COLUMNS_QUERY, [SCHEMA_NAME])
+    schema = {}
+    for table_name, name, col_type, nullable, default, primary_key in cursor.fetchall():
+        schema.setdefault(table_name, []).append({
+            "name": name,
+            "type": col_type,
+            "nullable": nullable,
+            "default": default,
+            "primary_key": primary_key,
+        })
 
-    conn.close()
+    if conn is not None:
+        conn.close()
     return schema
 
+def get_index_structure(cursor=None):
+    """{table: [{"name", "columns", "unique", "primary"}]} from one catalog query."""
+    conn = None
+    if cursor is None:
+        conn = get_pg_connection()
+        cursor = conn.cursor()
+
+    cursor.execute(INDEXES_QUERY, [SCHEMA_NAME])
+    indexes = {}
+    for table_name, name, unique, primary, columns in cursor.fetchall():
+        indexes.setdefault(table_name, []).append({
+            "name": name,
+            "columns": list(columns),
+            "unique": unique,
+            "primary": primary,
+        })
+
+    if conn is not None:
+        conn.close()
+    return indexes
+
 def export_schema():
     print(f"📦 Exporting schema for schema: {SCHEMA_NAME}")
-    structure = get_schema_structure()
+    conn = get_pg_connection()
+    cursor = conn.cursor()
+    structure = get_schema_structure(cursor)
+    indexes = get_index_structure(cursor)
+    conn.close()
     with open(OUTPUT_FILE, "w") as f:
         json.dump(structure, f, indent=2)
-    print(f"✅ Schema exported to {OUTPUT_FILE}")
+    with open(OUTPUT_INDEX_FILE, "w") as f:
+        json.dump(indexes, f, indent=2)
+    print(f"✅ Schema exported to {OUTPUT_FILE}, indexes to {OUTPUT_INDEX_FILE}")
 
 if __name__ == "__main__":
     export_schema()
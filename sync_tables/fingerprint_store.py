@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import hashlib
+from datetime import datetime
+
+# --- CONFIG ---
+FINGERPRINT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "table_fingerprints.sqlite")
+
+# mysqldump comment lines carry the host, server version and dump time, which
+# change on every export even when the data does not.
+_VOLATILE_PREFIX = b"--"
+
+# Stored in place of a fingerprint for a table whose chunked load committed only some
+# chunks; it never matches a real fingerprint, so the table is reloaded next run.
+PARTIAL = "partial"
+
+
+# --- HASHING ---
+def fingerprint_stream(stream):
+    """Streaming hash of a binary dump stream, ignoring `--` comment lines."""
+    digest = hashlib.blake2b(digest_size=20)
+    for line in stream:
+        if not line.startswith(_VOLATILE_PREFIX):
+            digest.update(line)
+    return digest.hexdigest()
+
+
+def fingerprint_file(path):
+    with open(path, "rb") as f:
+        return fingerprint_stream(f)
+
+
+class FingerprintReader:
+    """Binary stream wrapper that computes fingerprint_stream() of the bytes read through it.
+
+    Lets a consumer hash a dump while it streams it elsewhere (e.g. into mysql), so the
+    data is read and decompressed once. Long INSERT lines are hashed as they pass and
+    never buffered.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.blake2b(digest_size=20)
+        self._skip = None      # None at a line start, else whether the current line is a comment
+        self._pending = b""    # a lone byte at a line start, too short to classify yet
+
+    def read(self, size=-1):
+        block = self.stream.read(size)
+        if block:
+            self._feed(block)
+        elif self._pending:
+            self.digest.update(self._pending)   # final one-byte line without a newline
+            self._pending = b""
+        return block
+
+    def _feed(self, data):
+        data = self._pending + data
+        self._pending = b""
+        pos, n = 0, len(data)
+        while pos < n:
+            end = data.find(b"\n", pos)
+            if self._skip is None:
+                if end < 0 and n - pos < len(_VOLATILE_PREFIX):
+                    self._pending = data[pos:]
+                    return
+                self._skip = data.startswith(_VOLATILE_PREFIX, pos)
+            stop = n if end < 0 else end + 1
+            if not self._skip:
+                self.digest.update(data[pos:stop])
+            if end < 0:
+                return
+            self._skip = None
+            pos = stop
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def zip_member_key(info):
+    """Skip key for a zip member from its central directory entry; needs no decompression."""
+    return f"zip:{info.CRC:08x}:{info.file_size}"
+
+
+def content_fingerprint(stored):
+    """The content part of a stored fingerprint ("zip:<crc>:<size>/<content>" or "<content>")."""
+    return stored.rsplit("/", 1)[-1] if stored else stored
+
+
+# --- STORE ---
+class FingerprintStore:
+    """Last successfully loaded fingerprint per table, kept in a local SQLite file.
+
+    `scope` separates pipelines that load the same dump into different targets
+    (e.g. the MySQL import and the accelo_tap sync).
+    """
+
+    def __init__(self, scope, path=FINGERPRINT_DB):
+        self.scope = scope
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS table_fingerprints (
+                scope TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                loaded_at TEXT NOT NULL,
+                PRIMARY KEY (scope, table_name)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, table):
+        row = self.conn.execute(
+            "SELECT fingerprint FROM table_fingerprints WHERE scope = ? AND table_name = ?",
+            (self.scope, table),
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_unchanged(self, table, fingerprint):
+        return content_fingerprint(self.get(table)) == fingerprint
+
+    def record(self, table, fingerprint):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO table_fingerprints (scope, table_name, fingerprint, loaded_at) VALUES (?, ?, ?, ?)",
+            (self.scope, table, fingerprint, datetime.now().isoformat(timespec="seconds")),
+        )
+        self.conn.commit()
+
+    def mark_partial(self, table):
+        self.record(table, PARTIAL)
+
+    def is_partial(self, table):
+        return self.get(table) == PARTIAL
+
+    def forget(self, table):
+        self.conn.execute("DELETE FROM table_fingerprints WHERE scope = ? AND table_name = ?", (self.scope, table))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
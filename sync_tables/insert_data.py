@@ -1,11 +1,15 @@
 import os
-import re
 import json
 import logging
-import sqlparse
-import psycopg2
+import argparse
+import threading
+from itertools import groupby
+from operator import itemgetter
 from psycopg2.extras import execute_values
-from pg_conn import get_pg_connection
+from pg_conn import get_pg_connection, PG_BULK_SETUP
+from dump_lexer import iter_dump_rows
+from pg_copy import copy_rows_into_postgres
+from row_codec import get_row_codec
 from tqdm import tqdm
 
 # --- CONFIG ---
@@ -13,6 +17,9 @@ MYSQL_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_mysql_schema.json"
 PG_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_pg_schema.json"
 SQL_DUMP_DIR = r"C:/polaris_sync_agent/sync_tables/polarisforensics.accelo.com-2025-06-16T23_11_46"
 LOG_FILE = "C:/polaris_sync_agent/data_import.log"
+LOADERS = ("copy", "insert")
+INSERT_BATCH_ROWS = 500
+RSS_SAMPLE_SECONDS = 0.25  # --report-memory sampling interval
 
 # --- LOGGER ---
 logging.basicConfig(filename=LOG_FILE, level=logging.INFO,
@@ -23,43 +30,79 @@ def load_schema(path):
     with open(path, "r", encoding="utf-8") as f:
         return {k.lower(): v for k, v in json.load(f).items()}
 
-def extract_inserts(stmt):
-    """Split the VALUES section into row tuples using sqlparse."""
+def current_rss_mb():
+    """Current resident set size of this process, in MB (None when unavailable)."""
     try:
-        values_section = stmt.split("VALUES", 1)[1].rsplit(";", 1)[0].strip()
-        parsed = sqlparse.parse("INSERT INTO dummy VALUES " + values_section + ";")[0]
-        tokens = parsed.tokens[-2].tokens if hasattr(parsed.tokens[-2], 'tokens') else []
-        raw_rows = []
-        for token in tokens:
-            if token.ttype is None and str(token).startswith("("):
-                raw_rows.append(str(token))
-        return raw_rows
-    except Exception as e:
-        logging.error(f"Failed to extract inserts: {e}")
-        return []
-
-def clean_and_cast_values(values_str, col_types):
-    raw_values = re.split(r",(?![^()]*'\))", values_str.strip("()"))  # handles commas inside quotes
-    cleaned = []
-    for val, typ in zip(raw_values, col_types):
-        val = val.strip()
-        try:
-            if val.upper() == "NULL":
-                cleaned.append(None)
-            elif val.startswith("'") and val.endswith("'"):
-                cleaned.append(val[1:-1].replace("''", "'"))
-            elif typ.lower() == "boolean":
-                cleaned.append(val in ("1", "true", "TRUE", "t", "T"))
-            elif typ.lower() in ("integer", "bigint", "smallint"):
-                cleaned.append(int(val))
-            elif typ.lower() in ("real", "float", "decimal", "double precision"):
-                cleaned.append(float(val))
-            else:
-                cleaned.append(val.strip("'").replace("''", "'"))
-        except Exception as e:
-            logging.warning(f"Type coercion failed for value '{val}' as {typ}: {e}")
-            cleaned.append(None)
-    return cleaned
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        if get_info(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize / (1024 * 1024)
+    return None
+
+class RssSampler:
+    """Samples current RSS on a background thread while one table loads.
+
+    `start_mb` is the RSS when the table began and `peak_mb` the highest sample since,
+    so each table reports its own peak rather than the process-lifetime maximum.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        if self.start_mb is not None:
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak_mb:
+            self.peak_mb = rss
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        return self.start_mb, self.peak_mb
+
+def iter_statement_groups(table, file_path, col_defs):
+    """Stream (insert_columns, insert_types, rows) per run of INSERTs sharing a column list.
+
+    The file is read one buffer at a time, so memory stays bounded by the reader
+    buffer plus the loader batch no matter how big the dump is. INSERTs without a
+    column list fall back to the column order of `col_defs`.
+    """
+    default_columns = [col["name"] for col in col_defs]
+    for columns, group in groupby(iter_dump_rows(file_path), key=itemgetter(1)):
+        insert_columns = columns if columns is not None else default_columns
+        insert_types, codec = get_row_codec(table, insert_columns, col_defs)
+        yield insert_columns, insert_types, (codec(values) for _, _, values in group)
 
 def insert_data_into_postgres(table, columns, values, pg_types, cursor):
     cols = ', '.join(f'"{c}"' for c in columns)
@@ -73,9 +116,16 @@ def insert_data_into_postgres(table, columns, values, pg_types, cursor):
 
 # --- MAIN ---
 def main():
+    parser = argparse.ArgumentParser(description="Import Accelo SQL dump files into accelo_tap.")
+    parser.add_argument("--loader", choices=LOADERS, default="copy",
+                        help="'copy' streams rows over COPY FROM STDIN, 'insert' uses execute_values batches")
+    parser.add_argument("--report-memory", action="store_true",
+                        help="Log the peak RSS sampled while each table loads")
+    args = parser.parse_args()
+
     mysql_schema = load_schema(MYSQL_SCHEMA_PATH)
     pg_schema = load_schema(PG_SCHEMA_PATH)
-    conn = get_pg_connection()
+    conn = get_pg_connection(PG_BULK_SETUP)
     cursor = conn.cursor()
 
     total_inserted = 0
@@ -91,51 +141,36 @@ def main():
 
         logging.info(f"Processing table: {table}")
         col_defs = pg_schema[table]
-        all_rows = []
-
         file_path = os.path.join(SQL_DUMP_DIR, filename)
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
-
-        insert_statements = re.findall(r"INSERT INTO .*?VALUES\s*\(.*?\);", content, re.DOTALL | re.IGNORECASE)
-        for stmt in insert_statements:
-            match = re.match(r"INSERT INTO [`\"]?(\w+)[`\"]?(?: \((.*?)\))? VALUES", stmt, re.IGNORECASE)
-            if not match:
-                continue
-
-            col_str = match.group(2)
-            if col_str:
-                insert_columns = [c.strip(' `"') for c in col_str.split(",")]
-            else:
-                insert_columns = [col["name"] for col in col_defs]
-
-            insert_types = []
-            for col in insert_columns:
-                match = next((c for c in col_defs if c["name"] == col), None)
-                if match:
-                    insert_types.append(match["type"])
-                else:
-                    logging.warning(f"Column {col} not found in PG schema for {table}")
-                    insert_types.append("text")  # fallback
-
-            row_texts = extract_inserts(stmt)
-            for row_text in row_texts:
-                row = clean_and_cast_values(row_text, insert_types)
-                all_rows.append(row)
-
-            if len(all_rows) >= 500:
-                success = insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor)
-                if success:
-                    total_inserted += len(all_rows)
-                all_rows.clear()
+        sampler = RssSampler() if args.report_memory else None
 
-        if all_rows:
-            success = insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor)
-            if success:
-                total_inserted += len(all_rows)
+        try:
+            for insert_columns, insert_types, rows in iter_statement_groups(table, file_path, col_defs):
+                if args.loader == "copy":
+                    def fallback(tbl, columns, values):
+                        return insert_data_into_postgres(tbl, columns, values, insert_types, cursor)
+                    total_inserted += copy_rows_into_postgres(table, insert_columns, rows, cursor, fallback)
+                    continue
+
+                all_rows = []
+                for row in rows:
+                    all_rows.append(row)
+                    if len(all_rows) >= INSERT_BATCH_ROWS:
+                        if insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor):
+                            total_inserted += len(all_rows)
+                        all_rows = []
+                if all_rows and insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor):
+                    total_inserted += len(all_rows)
+        except Exception as e:
+            logging.error(f"Error while processing table {table}: {e}")
+            failed_tables.append(table)
 
         conn.commit()
-        logging.info(f"✅ Finished table: {table}")
+        start, peak = sampler.stop() if sampler else (None, None)
+        if peak is not None:
+            logging.info(f"✅ Finished table: {table} (RSS {start:.0f} MB at start, peak {peak:.0f} MB during table)")
+        else:
+            logging.info(f"✅ Finished table: {table}")
 
     cursor.close()
     conn.close()
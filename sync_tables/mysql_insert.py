@@ -1,6 +1,7 @@
 import os
 import mysql.connector
 from mysql.connector import Error
+from split_dump import list_parts, open_part
 
 # CONFIG
 SQL_DIR = r"C:/polaris_sync_agent/sql_parts"
@@ -13,7 +14,7 @@ MYSQL_CONFIG = {
 }
 
 def execute_sql_file(cursor, file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
+    with open_part(file_path) as f:
         sql_script = f.read()
 
     # Naive split by semicolon. Works if no compound blocks.
@@ -33,16 +34,15 @@ def main():
         cursor = conn.cursor()  # ✅ Default CMySQLCursor
         print(f"✅ Connected to MySQL at {MYSQL_CONFIG['host']}:{MYSQL_CONFIG['port']}")
 
-        for filename in sorted(os.listdir(SQL_DIR)):
-            if filename.endswith(".sql"):
-                full_path = os.path.join(SQL_DIR, filename)
-                print(f"⏳ Executing: {filename}")
-                try:
-                    execute_sql_file(cursor, full_path)
-                    conn.commit()
-                    print(f"✅ Done: {filename}")
-                except Error as e:
-                    print(f"❌ File Error: {e}")
+        for full_path in list_parts(SQL_DIR):
+            filename = os.path.basename(full_path)
+            print(f"⏳ Executing: {filename}")
+            try:
+                execute_sql_file(cursor, full_path)
+                conn.commit()
+                print(f"✅ Done: {filename}")
+            except Error as e:
+                print(f"❌ File Error: {e}")
         
         cursor.close()
         conn.close()
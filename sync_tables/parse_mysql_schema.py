@@ -1,60 +1,222 @@
 import os
 import json
 import re
+import gzip
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 SQL_FOLDER = r"C:/polaris_sync_agent/sql_parts"
 OUTPUT_JSON = "accelo_mysql_schema.json"
+OUTPUT_KEYS_JSON = "accelo_mysql_keys.json"
+OUTPUT_CATALOG_JSON = "accelo_mysql_catalog.json"
+CATALOG_FORMAT_VERSION = 2
+HEADER_CHUNK = 64 * 1024           # bytes read per step while looking for the end of CREATE TABLE
+MAX_HEADER_BYTES = 16 * 1024 * 1024  # give up on files whose definition is not within this prefix
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "8"))
+
+_CREATE_TABLE = re.compile(
+    r"CREATE TABLE\s+(?:IF NOT EXISTS\s+)?`?(\w+)`?\s*\((.*?)\n\)\s*((?:ENGINE|DEFAULT|CHARSET)[^;]*);",
+    re.DOTALL | re.IGNORECASE
+)
+_COLUMN_TYPE = re.compile(r"^(?P<base>\w+)(?:\((?P<params>[^)]*)\))?(?P<unsigned>\s+unsigned)?", re.IGNORECASE)
+_QUOTED = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_DEFAULT = re.compile(r"\bDEFAULT\s+('\d+'|[^\s,]+(?:\(\))?)", re.IGNORECASE)   # run on masked definitions
+_COMMENT = re.compile(r"\bCOMMENT\s+'(\d+)'", re.IGNORECASE)
+_FIRST_STATEMENT = re.compile(r"^(CREATE TABLE|INSERT INTO|LOCK TABLES|REPLACE INTO)", re.MULTILINE | re.IGNORECASE)
+_TABLE_OPTION = re.compile(r"\b(ENGINE|(?:DEFAULT\s+)?CHARSET|COLLATE)\s*=\s*(\w+)", re.IGNORECASE)
+
+_COLUMN_LINE = re.compile(r"^\s*`(?P<name>\w+)`\s+(?P<type>.*?),?\s*$", re.MULTILINE)
+_KEY_LINE = re.compile(
+    r"^\s*(?:(?P<primary>PRIMARY KEY)|(?P<unique>UNIQUE (?:KEY|INDEX))|(?P<other>FULLTEXT|SPATIAL)?\s*(?:KEY|INDEX))"
+    r"\s*(?:`(?P<name>[^`]+)`)?\s*\((?P<columns>.*)\)",
+    re.MULTILINE | re.IGNORECASE,
+)
 
 def extract_columns(column_block):
     columns = []
 
-    # Match every line that starts with a column definition using backticks
-    col_defs = re.findall(r"^\s*`(?P<name>\w+)`\s+(?P<type>.*?)(?:,|\n)", column_block, re.MULTILINE | re.DOTALL)
-
-    for name, type_expr in col_defs:
-        cleaned_type = re.sub(r"\s+", " ", type_expr.strip().rstrip(','))
+    # mysqldump writes one column per line, so the type runs to the end of the line;
+    # enum/set literals and COMMENTs keep their commas.
+    for match in _COLUMN_LINE.finditer(column_block):
+        cleaned_type = re.sub(r"\s+", " ", match.group("type").strip())
         columns.append({
-            "name": name,
+            "name": match.group("name"),
             "type": cleaned_type
         })
 
     return columns
 
-def parse_sql_file(filepath):
-    with open(filepath, encoding="utf-8", errors="ignore") as f:
-        content = f.read()
-
-    # Extract full CREATE TABLE block, multi-line safe
-    match = re.search(
-        r"CREATE TABLE\s+`?(\w+)`?\s*\((.*?)\)[^\)]*(ENGINE|DEFAULT|CHARSET)",
-        content,
-        re.DOTALL | re.IGNORECASE
-    )
+def split_key_columns(column_list):
+    # `name`(191) prefix lengths and ASC/DESC do not carry over to PostgreSQL
+    return [re.sub(r"\(\d+\)", "", c).strip(" `").split(" ")[0] for c in column_list.split(",")]
+
+def extract_keys(column_block):
+    """{"primary_key": [...], "indexes": [{"name", "columns", "unique"}]} from the key lines.
+
+    FULLTEXT and SPATIAL keys have no B-tree equivalent and are skipped.
+    """
+    keys = {"primary_key": [], "indexes": []}
+    for match in _KEY_LINE.finditer(column_block):
+        columns = split_key_columns(match.group("columns"))
+        if match.group("primary"):
+            keys["primary_key"] = columns
+        elif not match.group("other"):
+            keys["indexes"].append({
+                "name": match.group("name"),
+                "columns": columns,
+                "unique": bool(match.group("unique")),
+            })
+    return keys
+
+def extract_primary_key(column_block):
+    return extract_keys(column_block)["primary_key"]
+
+def describe_column(name, definition):
+    """Column metadata beyond the raw type: base type, parameters, nullability, default, ..."""
+    match = _COLUMN_TYPE.match(definition)
+
+    # Quoted literals (enum values, defaults, comments) may contain any keyword, so the
+    # checks below run on a copy where each literal is replaced by '<index>'.
+    literals = []
+    def mask(m):
+        literals.append(m.group(0))
+        return f"'{len(literals) - 1}'"
+    masked = _QUOTED.sub(mask, definition)
+    upper = masked.upper()
+
+    def literal(value):
+        return literals[int(value[1:-1])] if value.startswith("'") else value
+
+    default = _DEFAULT.search(masked)
+    default = literal(default.group(1)) if default else None
+    comment = _COMMENT.search(masked)
+    comment = literals[int(comment.group(1))][1:-1] if comment else None
+    return {
+        "name": name,
+        "type": definition,
+        "data_type": match.group("base").lower() if match else None,
+        "params": match.group("params") if match else None,
+        "unsigned": bool(match and match.group("unsigned")),
+        "nullable": "NOT NULL" not in upper,
+        "default": default if default and default.upper() != "NULL" else None,
+        "auto_increment": "AUTO_INCREMENT" in upper,
+        "comment": comment,
+    }
+
+def extract_table_options(options_block):
+    options = {}
+    for key, value in _TABLE_OPTION.findall(options_block):
+        options[key.upper().replace("DEFAULT ", "")] = value
+    return {
+        "engine": options.get("ENGINE"),
+        "charset": options.get("CHARSET"),
+        "collation": options.get("COLLATE"),
+    }
+
+def read_create_table(filepath):
+    """The CREATE TABLE match from the head of a dump part, or None.
+
+    Reads HEADER_CHUNK bytes at a time and stops as soon as the definition is closed,
+    so the row data behind it is never touched. A part whose first statement is
+    data (INSERT / LOCK TABLES) is given up on at once.
+    """
+    head = ""
+    start = -1        # offset of CREATE TABLE in head
+    closing = False
+    opener = gzip.open if filepath.lower().endswith(".gz") else open
+    with opener(filepath, "rt", encoding="utf-8", errors="ignore") as f:
+        while len(head) < MAX_HEADER_BYTES:
+            chunk = f.read(HEADER_CHUNK)
+            if not chunk:
+                break
+            scan_from = max(0, len(head) - 16)   # a keyword may straddle the chunk boundary
+            head += chunk
+            if start < 0:
+                first = _FIRST_STATEMENT.search(head, scan_from)
+                if not first:
+                    continue
+                if first.group(1).upper() != "CREATE TABLE":
+                    return None   # data-only part
+                start = first.start()
+                scan_from = start
+            closing = closing or head.find("\n)", max(start, scan_from - 2)) >= 0
+            if not closing:
+                continue   # the definition has not reached its closing line yet
+            match = _CREATE_TABLE.match(head, start)
+            if match:
+                return match
+    return None
+
+def parse_table(filepath):
+    """(table_name, catalog entry) for one dump part, or None if it has no CREATE TABLE."""
+    match = read_create_table(filepath)
     if not match:
         return None
 
     table_name = match.group(1)
     column_block = match.group(2)
-    columns = extract_columns(column_block)
-    return table_name, columns
+    entry = extract_keys(column_block)
+    entry["columns"] = [describe_column(c["name"], c["type"]) for c in extract_columns(column_block)]
+    entry["options"] = extract_table_options(match.group(3))
+    return table_name, entry
+
+def parse_sql_file(filepath):
+    parsed = parse_table(filepath)
+    if not parsed:
+        return None
+    table_name, entry = parsed
+    columns = [{"name": c["name"], "type": c["type"]} for c in entry["columns"]]
+    keys = {"primary_key": entry["primary_key"], "indexes": entry["indexes"]}
+    return table_name, columns, keys
+
+def parse_catalog(folder, workers=PARSE_WORKERS):
+    """{table: {"columns", "primary_key", "indexes", "options"}} for every part in folder, parsed in parallel."""
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith((".sql", ".sql.gz")))
+    tables = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for parsed in tqdm(pool.map(parse_table, files), total=len(files), desc="Parsing SQL files"):
+            if parsed:
+                table_name, entry = parsed
+                tables[table_name] = entry
+    return tables
 
 def parse_all_sql_files(folder):
     schema = {}
-    files = [f for f in os.listdir(folder) if f.lower().endswith(".sql")]
-    for filename in tqdm(files, desc="Parsing SQL files"):
-        full_path = os.path.join(folder, filename)
-        parsed = parse_sql_file(full_path)
-        if parsed:
-            table_name, columns = parsed
-            schema[table_name] = columns
-    return schema
-
-def export_schema_json(schema):
+    keys = {}
+    for table_name, entry in parse_catalog(folder).items():
+        schema[table_name] = [{"name": c["name"], "type": c["type"]} for c in entry["columns"]]
+        keys[table_name] = {"primary_key": entry["primary_key"], "indexes": entry["indexes"]}
+    return schema, keys
+
+def make_catalog(tables):
+    return {
+        "format_version": CATALOG_FORMAT_VERSION,
+        "tables": {name: tables[name] for name in sorted(tables)},
+    }
+
+def export_catalog_json(tables):
+    """Write the versioned catalog plus the legacy schema/keys files built from it."""
+    schema = {name: [{"name": c["name"], "type": c["type"]} for c in entry["columns"]]
+              for name, entry in tables.items()}
+    keys = {name: {"primary_key": entry["primary_key"], "indexes": entry["indexes"]}
+            for name, entry in tables.items()}
+    with open(OUTPUT_CATALOG_JSON, "w", encoding="utf-8") as f:
+        json.dump(make_catalog(tables), f, indent=2, sort_keys=True)
+    export_schema_json(schema, keys)
+    print(f"✅ Exported catalog (format {CATALOG_FORMAT_VERSION}) to {OUTPUT_CATALOG_JSON}")
+
+def export_schema_json(schema, keys):
     with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
         json.dump(schema, f, indent=2)
-    print(f"\n✅ Exported schema to {OUTPUT_JSON}")
+    with open(OUTPUT_KEYS_JSON, "w", encoding="utf-8") as f:
+        json.dump(keys, f, indent=2)
+    print(f"\n✅ Exported schema to {OUTPUT_JSON} and keys to {OUTPUT_KEYS_JSON}")
 
 if __name__ == "__main__":
-    schema = parse_all_sql_files(SQL_FOLDER)
-    export_schema_json(schema)
+    import argparse
+    parser = argparse.ArgumentParser(description="Extract table definitions from sql_parts")
+    parser.add_argument("--folder", default=SQL_FOLDER)
+    parser.add_argument("--workers", type=int, default=PARSE_WORKERS)
+    args = parser.parse_args()
+
+    export_catalog_json(parse_catalog(args.folder, args.workers))
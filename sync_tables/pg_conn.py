@@ -1,16 +1,8 @@
 # pg_conn.py
 import os
-import psycopg2
-from dotenv import load_dotenv
+import sys
 
-load_dotenv()  # Load .env file
+# The pools live in the repo root's db_pool.py; sync_tables scripts run from this folder.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def get_pg_connection():
-    conn = psycopg2.connect(
-        dbname=os.getenv("DBNAME"),
-        user=os.getenv("DBUSER"),
-        password=os.getenv("DBPASSWORD"),
-        host=os.getenv("DBHOST"),
-        port=os.getenv("DBPORT")
-    )
-    return conn
+from db_pool import get_pg_connection, pg_connection, iter_pg_rows, PG_BULK_SETUP
@@ -0,0 +1,124 @@
+import io
+import re
+import json
+import logging
+from datetime import date, datetime, time
+from itertools import islice
+
+# --- CONFIG ---
+COPY_BATCH_ROWS = 20000     # rows per COPY; also the most rows held for the fallback path
+COPY_CHUNK_BYTES = 1 << 16  # encoded bytes handed to psycopg2 per read
+FALLBACK_PAGE_ROWS = 500    # execute_values page size when COPY rejects a batch
+
+_NEEDS_ESCAPE = re.compile(r"[\\\t\n\r]")
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+# --- ENCODER ---
+def encode_copy_value(val):
+    """Render one Python value in PostgreSQL COPY text format."""
+    if val is None:
+        return "\\N"
+    if val is True:
+        return "t"
+    if val is False:
+        return "f"
+    if isinstance(val, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(val).hex()
+    if isinstance(val, (dict, list)):
+        val = json.dumps(val)
+    elif isinstance(val, (datetime, date, time)):
+        return val.isoformat()
+    elif not isinstance(val, str):
+        return str(val)
+    if _NEEDS_ESCAPE.search(val):
+        return val.translate(_COPY_ESCAPES)
+    return val
+
+
+def encode_copy_rows(rows, chunk_bytes=COPY_CHUNK_BYTES):
+    """Yield COPY text-format bytes for `rows`, grouped into chunks of about chunk_bytes."""
+    lines = []
+    size = 0
+    for row in rows:
+        line = "\t".join([encode_copy_value(v) for v in row]) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield "".join(lines).encode("utf-8")
+            lines.clear()
+            size = 0
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+
+class IteratorFile(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, for cursor.copy_expert()."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+# --- LOADER ---
+def copy_sql(table, columns):
+    cols = ', '.join(f'"{c}"' for c in columns)
+    return f'COPY accelo_tap."{table}" ({cols}) FROM STDIN'
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream `rows` into accelo_tap.<table> with a single COPY."""
+    cursor.copy_expert(copy_sql(table, columns), IteratorFile(encode_copy_rows(rows)), size=COPY_CHUNK_BYTES)
+
+
+def _fallback_insert(cursor, table, columns, batch, fallback):
+    """Re-send a batch COPY rejected through `fallback` page by page; returns rows inserted."""
+    inserted = 0
+    for start in range(0, len(batch), FALLBACK_PAGE_ROWS):
+        page = batch[start:start + FALLBACK_PAGE_ROWS]
+        cursor.execute("SAVEPOINT fallback_page")
+        if fallback(table, columns, page):
+            cursor.execute("RELEASE SAVEPOINT fallback_page")
+            inserted += len(page)
+        else:
+            cursor.execute("ROLLBACK TO SAVEPOINT fallback_page")
+    return inserted
+
+
+def copy_rows_into_postgres(table, columns, rows, cursor, fallback=None):
+    """Load an iterable of rows through COPY in bounded batches.
+
+    Each batch runs under a savepoint; if COPY rejects it the batch is rolled back and,
+    when given, handed to fallback(table, columns, rows) -> bool (the execute_values
+    path). Returns the number of rows loaded.
+    """
+    rows = iter(rows)
+    inserted = 0
+    while True:
+        batch = list(islice(rows, COPY_BATCH_ROWS))
+        if not batch:
+            return inserted
+        cursor.execute("SAVEPOINT copy_batch")
+        try:
+            copy_rows(cursor, table, columns, batch)
+            cursor.execute("RELEASE SAVEPOINT copy_batch")
+            inserted += len(batch)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT copy_batch")
+            logging.warning(f"COPY rejected a batch of {len(batch)} rows for {table}: {e}")
+            if fallback is not None:
+                inserted += _fallback_insert(cursor, table, columns, batch, fallback)
@@ -0,0 +1,119 @@
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+
+# --- CONFIG ---
+TRUE_VALUES = frozenset(("1", "t", "true", "y", "yes", "on", 1, True))
+ZERO_DATES = ("0000-00-00", "0000-00-00 00:00:00")
+
+_codec_cache = {}
+
+
+# --- CONVERTERS ---
+def to_bool(val):
+    if isinstance(val, str):
+        val = val.lower()
+    return val in TRUE_VALUES
+
+
+def to_text(val):
+    if isinstance(val, bytes):
+        return val.decode("utf-8", errors="ignore")
+    return str(val)
+
+
+def to_bytes(val):
+    if isinstance(val, str):
+        return val.encode("utf-8")
+    return val
+
+
+def to_timestamp(val):
+    if val.startswith("0000-00-00"):
+        return None
+    return datetime.fromisoformat(val)
+
+
+def to_date(val):
+    if val in ZERO_DATES:
+        return None
+    return date.fromisoformat(val[:10])
+
+
+def to_time(val):
+    return time.fromisoformat(val)
+
+
+def to_json(val):
+    """Validate JSON text and pass it through unchanged; PostgreSQL stores the text."""
+    json.loads(val)
+    return val
+
+
+def converter_for(pg_type):
+    """Pick the converter for a PostgreSQL type name as stored in accelo_pg_schema.json."""
+    pg_type = pg_type.lower()
+    base = pg_type.split("(", 1)[0].strip()
+    if base in ("integer", "bigint", "smallint", "int", "int2", "int4", "int8", "serial", "bigserial"):
+        return int
+    if base == "boolean":
+        return to_bool
+    if base in ("numeric", "decimal"):
+        return Decimal
+    if base in ("real", "float", "double precision", "float4", "float8"):
+        return float
+    if base.startswith("timestamp"):
+        return to_timestamp
+    if base == "date":
+        return to_date
+    if base.startswith("time"):
+        return to_time
+    if base in ("json", "jsonb"):
+        return to_json
+    if base == "bytea":
+        return to_bytes
+    return to_text
+
+
+# --- CODECS ---
+def build_row_codec(table, columns, col_types):
+    """Return a function that converts one raw dump row into values typed for `col_types`."""
+    converters = tuple(converter_for(t) for t in col_types)
+
+    def convert_slow(row):
+        cleaned = []
+        for val, conv, typ in zip(row, converters, col_types):
+            if val is None:
+                cleaned.append(None)
+                continue
+            try:
+                cleaned.append(conv(val))
+            except Exception as e:
+                logging.warning(f"Type coercion failed for {table} value '{val}' as {typ}: {e}")
+                cleaned.append(None)
+        return cleaned
+
+    def convert(row):
+        try:
+            return [None if val is None else conv(val) for conv, val in zip(converters, row)]
+        except Exception:
+            return convert_slow(row)
+
+    return convert
+
+
+def get_row_codec(table, columns, col_defs):
+    """Cached (table, column list) -> (col_types, codec); columns missing from col_defs are text."""
+    key = (table, tuple(columns))
+    cached = _codec_cache.get(key)
+    if cached is None:
+        types_by_name = {c["name"]: c["type"] for c in col_defs}
+        col_types = []
+        for col in columns:
+            if col not in types_by_name:
+                logging.warning(f"Column {col} not found in PG schema for {table}")
+            col_types.append(types_by_name.get(col, "text"))
+        cached = (col_types, build_row_codec(table, columns, col_types))
+        _codec_cache[key] = cached
+    return cached
@@ -0,0 +1,242 @@
+import os
+import re
+import io
+import gzip
+import json
+import time
+import hashlib
+import logging
+import zipfile
+
+# --- CONFIG ---
+OUTPUT_DIR = r"C:/polaris_sync_agent/sql_parts"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+READ_BUFFER = 8 << 20        # source read buffer
+WRITE_BUFFER = 8 << 20       # per-part write buffer; one part is open at a time
+COMPRESS_LEVEL = 1           # gzip level for --gzip; parts are rewritten every export, speed wins
+
+# mysqldump opens every object with a comment block naming it; data-only dumps
+# (--no-create-info) have no such block, so the first statement naming a table counts too.
+_SECTION_COMMENT = re.compile(
+    rb"^-- (?:Table structure for table|Dumping data for table|(?:Temporary|Final) view structure for view) `([^`]+)`"
+)
+_SECTION_STATEMENT = re.compile(
+    rb"^(?:DROP TABLE IF EXISTS|CREATE TABLE|LOCK TABLES|INSERT INTO) `([^`]+)`"
+)
+_DATABASE_SECTION = re.compile(rb"^-- Dumping (events|routines) for database")
+_ROW_SEPARATOR = b"),("
+
+
+class PartWriter:
+    """Appends one section's lines to its part file and keeps its manifest entry.
+
+    Parts are closed whenever another section starts and reopened in append mode if
+    the same table appears again, so a dump with thousands of tables never holds more
+    than one output file open. Reopened gzip parts become multi-member gzip files,
+    which gzip readers treat as one stream.
+    """
+
+    def __init__(self, out_dir, name, compress, preamble):
+        self.name = name
+        self.filename = name + (".sql.gz" if compress else ".sql")
+        self.path = os.path.join(out_dir, self.filename)
+        self.compress = compress
+        self.preamble = preamble
+        self.sha256 = hashlib.sha256()
+        self.offsets = []
+        self.bytes = 0
+        self.rows_estimate = 0
+        self.insert_statements = 0
+        self.created = False
+        self.f = None
+        self._file = None
+
+    def open(self, offset):
+        mode = "ab" if self.created else "wb"
+        raw = self._file = open(self.path, mode, buffering=0)
+        if self.compress:
+            raw = gzip.GzipFile(fileobj=raw, mode=mode, compresslevel=COMPRESS_LEVEL)
+        self.f = io.BufferedWriter(raw, buffer_size=WRITE_BUFFER)
+        self.offsets.append([offset, offset])
+        if not self.created:
+            self.created = True
+            self.write(self.preamble)
+
+    def write(self, data):
+        self.f.write(data)
+        self.sha256.update(data)
+        self.bytes += len(data)
+
+    def write_line(self, line, end_offset):
+        if line.startswith(b"INSERT INTO "):
+            self.insert_statements += 1
+            self.rows_estimate += line.count(_ROW_SEPARATOR) + 1
+        self.write(line)
+        self.offsets[-1][1] = end_offset
+
+    def close(self):
+        if self.f is not None:
+            try:
+                self.f.close()       # flushes the buffer and writes the gzip trailer
+            finally:
+                self._file.close()   # GzipFile(fileobj=...) leaves the file itself open
+                self.f = self._file = None
+
+    def manifest_entry(self):
+        return {
+            "file": self.filename,
+            "offsets": self.offsets,
+            "bytes": self.bytes,
+            "compressed_bytes": os.path.getsize(self.path) if self.compress else self.bytes,
+            "rows_estimate": self.rows_estimate,
+            "insert_statements": self.insert_statements,
+            "sha256": self.sha256.hexdigest(),
+        }
+
+
+# --- HELPERS ---
+def section_name(line, current):
+    """Name of the section `line` starts, or None if it continues the current one."""
+    if line.startswith(b"-- "):
+        match = _SECTION_COMMENT.match(line)
+        if match:
+            name = match.group(1).decode("utf-8", "replace")
+        else:
+            match = _DATABASE_SECTION.match(line)
+            name = "_" + match.group(1).decode("ascii") if match else None
+    else:
+        match = _SECTION_STATEMENT.match(line)
+        name = match.group(1).decode("utf-8", "replace") if match else None
+    return name if name != current else None
+
+
+def safe_filename(name):
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def open_dump(source, member=None):
+    """Binary stream over a .sql dump, a .sql.gz dump or a .sql member of a zip.
+
+    For a zip without `member` the largest .sql member is used. Returns
+    (stream, description, size).
+    """
+    if zipfile.is_zipfile(source):
+        zf = zipfile.ZipFile(source)
+        if member is None:
+            members = [i for i in zf.infolist() if not i.is_dir() and i.filename.lower().endswith(".sql")]
+            if not members:
+                zf.close()
+                raise FileNotFoundError(f"No .sql member in {source}")
+            info = max(members, key=lambda i: i.file_size)
+        else:
+            info = zf.getinfo(member)
+        stream = io.BufferedReader(zf.open(info), buffer_size=READ_BUFFER)
+        return stream, f"{source}!{info.filename}", info.file_size
+    if source.lower().endswith(".gz"):
+        return io.BufferedReader(gzip.open(source, "rb"), buffer_size=READ_BUFFER), source, None
+    return open(source, "rb", buffering=READ_BUFFER), source, os.path.getsize(source)
+
+
+# --- MAIN ---
+def split_dump(source, out_dir=OUTPUT_DIR, member=None, compress=False):
+    """Split a monolithic mysqldump into one part per table in a single streaming pass.
+
+    Every part starts with the dump's preamble (the SET / charset header before the
+    first table) so it can be imported on its own. Writes manifest.json next to the
+    parts with, per table, the source byte ranges, byte count, estimated row count and
+    sha256 of the part's SQL. Returns the manifest.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stream, description, size = open_dump(source, member)
+    started = time.perf_counter()
+
+    preamble = []
+    parts = {}
+    current = None
+    writer = None
+    offset = 0
+    try:
+        for line in stream:
+            start, offset = offset, offset + len(line)
+            name = section_name(line, current)
+            if name is not None:
+                if writer is not None:
+                    writer.close()
+                current = name
+                writer = parts.get(name)
+                if writer is None:
+                    writer = parts[name] = PartWriter(out_dir, safe_filename(name), compress, b"".join(preamble))
+                writer.open(start)
+            if writer is None:
+                preamble.append(line)
+            else:
+                writer.write_line(line, offset)
+    finally:
+        if writer is not None:
+            writer.close()
+        stream.close()
+
+    manifest = {
+        "format_version": MANIFEST_FORMAT_VERSION,
+        "source": description,
+        "source_bytes": offset if size is None else size,
+        "compressed": compress,
+        "preamble_bytes": sum(len(line) for line in preamble),
+        "tables": {name: w.manifest_entry() for name, w in parts.items()},
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    seconds = time.perf_counter() - started
+    rows = sum(t["rows_estimate"] for t in manifest["tables"].values())
+    logging.info(f"Split {description}: {len(parts)} parts, ~{rows} rows, "
+                 f"{offset / (1 << 20):.1f} MiB in {seconds:.1f}s")
+    return manifest
+
+
+def load_manifest(out_dir=OUTPUT_DIR):
+    """Manifest of a split folder, or None if the folder was not produced by split_dump()."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def schedule(manifest):
+    """Table names ordered largest first, so parallel loaders start the long parts early."""
+    return sorted(manifest["tables"], key=lambda t: manifest["tables"][t]["bytes"], reverse=True)
+
+
+def list_parts(folder=OUTPUT_DIR):
+    """Paths of the .sql / .sql.gz parts in folder.
+
+    Folders written by split_dump() are listed from their manifest, largest part
+    first, without scanning the directory; others are scanned by name.
+    """
+    manifest = load_manifest(folder)
+    if manifest is not None:
+        paths = [os.path.join(folder, manifest["tables"][t]["file"]) for t in schedule(manifest)]
+        return [p for p in paths if os.path.exists(p)]
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith((".sql", ".sql.gz")))
+
+
+def open_part(path, mode="rt"):
+    """Open a part for reading whether or not it was written with --gzip."""
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8") if "t" in mode else gzip.open(path, mode)
+    return open(path, mode, encoding="utf-8") if "t" in mode else open(path, mode)
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Split a mysqldump (file or zip member) into per-table sql_parts")
+    parser.add_argument("source", help="Dump .sql / .sql.gz file or export .zip")
+    parser.add_argument("--out", default=OUTPUT_DIR, help="Output folder (default: sql_parts)")
+    parser.add_argument("--member", help="Zip member to split (default: the largest .sql member)")
+    parser.add_argument("--gzip", action="store_true", help="Write .sql.gz parts")
+    args = parser.parse_args()
+
+    split_dump(args.source, args.out, args.member, args.gzip)
@@ -3,6 +3,7 @@ import json
 import sqlparse
 from sqlparse.sql import Statement
 from datetime import datetime
+from split_dump import list_parts, open_part
 
 OUTPUT_DIR = "C:/polaris_sync_agent/sql_inspector_output"
 SQL_DIR = "C:/polaris_sync_agent/sql_parts"
@@ -35,7 +36,7 @@ def analyze_statement(stmt: Statement):
 
 
 def analyze_file(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
+    with open_part(filepath) as f:
         content = f.read()
 
     parsed = sqlparse.parse(content)
@@ -73,12 +74,9 @@ def main():
         json_file.write('{\n')
 
         first = True
-        for file in os.listdir(SQL_DIR):
-            if not file.endswith('.sql'):
-                continue
-
+        for full_path in list_parts(SQL_DIR):
+            file = os.path.basename(full_path)
             print(f"Analyzing {file}...")
-            full_path = os.path.join(SQL_DIR, file)
             file_results = analyze_file(full_path)
 
             # JSON: write as stream
@@ -0,0 +1,224 @@
+import os
+import re
+import logging
+
+# --- CONFIG ---
+SCHEMA = "accelo_tap"
+STAGING_SUFFIX = "__staging"
+OLD_SUFFIX = "__old"
+# The staging table is loaded UNLOGGED and converted with SET LOGGED before it goes
+# live, which writes the table to WAL once. SWAP_UNLOGGED=1 skips that and leaves it
+# UNLOGGED: PostgreSQL empties such tables after a crash and never replicates them to
+# standbys, so sync_table then forgets the table's fingerprint to force a reload next run.
+SET_LOGGED = os.getenv("SWAP_UNLOGGED", "0") != "1"
+SWAP_LOCK_TIMEOUT = "5s"   # give up rather than queue behind long-running readers
+
+_INDEX_DEF = re.compile(r"^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .*)$", re.DOTALL)
+
+
+def pg_name(base, suffix):
+    """Append a suffix while staying inside PostgreSQL's 63-byte identifier limit."""
+    return base[:63 - len(suffix)] + suffix
+
+
+def staging_name(table):
+    return pg_name(table, STAGING_SUFFIX)
+
+
+# --- STAGING ---
+def create_staging_table(cursor, table):
+    """Create an empty UNLOGGED copy of accelo_tap.<table> with columns and defaults but no indexes."""
+    staging = staging_name(table)
+    cursor.execute(f'DROP TABLE IF EXISTS {SCHEMA}."{staging}"')
+    cursor.execute(f'CREATE UNLOGGED TABLE {SCHEMA}."{staging}" '
+                   f'(LIKE {SCHEMA}."{table}" INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY)')
+    return staging
+
+
+def get_constraints(cursor, table):
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('p', 'u')
+    """, (f'{SCHEMA}."{table}"',))
+    return cursor.fetchall()
+
+
+def get_plain_indexes(cursor, table):
+    """Indexes on the table that do not back a PRIMARY KEY/UNIQUE constraint."""
+    cursor.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+    """, (f'{SCHEMA}."{table}"',))
+    return cursor.fetchall()
+
+
+def build_staging_indexes(cursor, table, staging):
+    """Recreate the live table's keys and indexes on the loaded staging table.
+
+    Returns [(kind, staging_name, live_name)] for swap_in() to rename afterwards.
+    """
+    renames = []
+    for name, definition in get_constraints(cursor, table):
+        tmp = pg_name(name, STAGING_SUFFIX)
+        cursor.execute(f'ALTER TABLE {SCHEMA}."{staging}" ADD CONSTRAINT "{tmp}" {definition}')
+        renames.append(("constraint", tmp, name))
+    for name, definition in get_plain_indexes(cursor, table):
+        match = _INDEX_DEF.match(definition)
+        if not match:
+            logging.warning(f"Cannot rebuild index {name} on {table}: {definition}")
+            continue
+        tmp = pg_name(name, STAGING_SUFFIX)
+        cursor.execute(f'{match.group(1)} "{tmp}" ON {SCHEMA}."{staging}" {match.group(2)}')
+        renames.append(("index", tmp, name))
+    return renames
+
+
+def copy_grants(cursor, table, staging):
+    cursor.execute("""
+        SELECT grantee, privilege_type
+        FROM information_schema.role_table_grants
+        WHERE table_schema = %s AND table_name = %s
+    """, (SCHEMA, table))
+    for grantee, privilege in cursor.fetchall():
+        role = "PUBLIC" if grantee == "PUBLIC" else f'"{grantee}"'   # PUBLIC is a keyword, not a role
+        cursor.execute(f'GRANT {privilege} ON {SCHEMA}."{staging}" TO {role}')
+
+
+def get_dependents(cursor, table):
+    """Views and foreign keys that reference accelo_tap.<table>.
+
+    They are bound to the table's oid, so after a swap they would follow the renamed
+    old table instead of the new one.
+    """
+    cursor.execute("""
+        SELECT DISTINCT v.oid::regclass::text
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refobjid = %s::regclass
+          AND v.oid <> d.refobjid
+        UNION
+        SELECT conname || ' on ' || conrelid::regclass::text
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = %s::regclass
+    """, (f'{SCHEMA}."{table}"', f'{SCHEMA}."{table}"'))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def drop_old_table(conn, table):
+    """Drop a leftover <table>__old in its own transaction; returns False if it cannot go."""
+    old = pg_name(table, OLD_SUFFIX)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'DROP TABLE IF EXISTS {SCHEMA}."{old}"')
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        logging.warning(f"Kept {SCHEMA}.{old}, it still has dependents: {e}")
+        return False
+    finally:
+        cursor.close()
+
+
+# --- SWAP ---
+def swap_in(conn, table, staging, renames):
+    """Atomically replace accelo_tap.<table> with the staging table, then ANALYZE it.
+
+    Readers see either the old table or the fully loaded one. The old table is
+    dropped afterwards in its own transaction; callers check get_dependents() first,
+    so nothing should still reference it.
+    """
+    old = pg_name(table, OLD_SUFFIX)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+        for kind, _, live in renames:
+            if kind == "constraint":
+                cursor.execute(f'ALTER TABLE {SCHEMA}."{table}" RENAME CONSTRAINT "{live}" TO "{pg_name(live, OLD_SUFFIX)}"')
+            else:
+                cursor.execute(f'ALTER INDEX {SCHEMA}."{live}" RENAME TO "{pg_name(live, OLD_SUFFIX)}"')
+        cursor.execute(f'ALTER TABLE {SCHEMA}."{table}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER TABLE {SCHEMA}."{staging}" RENAME TO "{table}"')
+        for kind, tmp, live in renames:
+            if kind == "constraint":
+                cursor.execute(f'ALTER TABLE {SCHEMA}."{table}" RENAME CONSTRAINT "{tmp}" TO "{live}"')
+            else:
+                cursor.execute(f'ALTER INDEX {SCHEMA}."{tmp}" RENAME TO "{live}"')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    try:
+        cursor.execute(f'ANALYZE {SCHEMA}."{table}"')
+        conn.commit()
+    finally:
+        cursor.close()
+    drop_old_table(conn, table)
+
+
+def load_in_place(conn, table, load):
+    """Replace the rows of accelo_tap.<table> inside one transaction.
+
+    Used when the table cannot be swapped. Readers keep seeing the old rows until the
+    commit; the deleted rows are left for autovacuum.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'DELETE FROM {SCHEMA}."{table}"')
+        inserted = load(table, cursor)
+        conn.commit()
+        cursor.execute(f'ANALYZE {SCHEMA}."{table}"')
+        conn.commit()
+        return inserted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def load_with_swap(conn, table, load):
+    """Run load(staging_table, cursor) into a fresh staging copy of `table` and swap it in.
+
+    Tables referenced by views or foreign keys, or whose previous __old copy cannot be
+    dropped, are loaded in place instead (load_in_place()). `load` returns the number
+    of rows written, which is passed back to the caller.
+    """
+    cursor = conn.cursor()
+    try:
+        dependents = get_dependents(cursor, table)
+        conn.commit()
+    finally:
+        cursor.close()
+    if dependents:
+        logging.warning(f"{table} is referenced by {', '.join(dependents)}; loading in place instead of swapping")
+        return load_in_place(conn, table, load)
+    if not drop_old_table(conn, table):
+        return load_in_place(conn, table, load)
+
+    cursor = conn.cursor()
+    try:
+        staging = create_staging_table(cursor, table)
+        conn.commit()
+        inserted = load(staging, cursor)
+        renames = build_staging_indexes(cursor, table, staging)
+        copy_grants(cursor, table, staging)
+        if SET_LOGGED:
+            cursor.execute(f'ALTER TABLE {SCHEMA}."{staging}" SET LOGGED')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        cursor.execute(f'DROP TABLE IF EXISTS {SCHEMA}."{staging_name(table)}"')
+        conn.commit()
+        raise
+    finally:
+        cursor.close()
+    swap_in(conn, table, staging, renames)
+    return inserted
@@ -1,13 +1,19 @@
 import os
-import re
 import json
+import time
 import logging
-import sqlparse
-import csv
-import io
-import psycopg2
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+from operator import itemgetter
 from psycopg2.extras import execute_values
-from pg_conn import get_pg_connection
+from pg_conn import get_pg_connection, PG_BULK_SETUP
+from dump_lexer import iter_dump_rows, split_insert_ranges
+from pg_copy import copy_rows_into_postgres
+from row_codec import get_row_codec
+from fingerprint_store import FingerprintStore, fingerprint_file
+from delta_sync import delta_sync_table
+from staging_swap import load_with_swap, SET_LOGGED
 from tqdm import tqdm
 
 # --- CONFIG ---
@@ -15,6 +21,9 @@ MYSQL_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_mysql_schema.json"
 PG_SCHEMA_PATH = "C:/polaris_sync_agent/sync_tables/accelo_pg_schema.json"
 SQL_DUMP_DIR = r"C:/polaris_sync_agent/sync_tables/polarisforensics.accelo.com-2025-06-16T23_11_46"
 LOG_FILE = "C:/polaris_sync_agent/data_import.log"
+LOADERS = ("copy", "insert", "delta")
+INSERT_BATCH_ROWS = 500
+CHUNK_MB = 256  # dump files larger than this are split across workers
 
 # --- LOGGER ---
 logging.basicConfig(filename=LOG_FILE, level=logging.INFO,
@@ -25,59 +34,6 @@ def load_schema(path):
     with open(path, "r", encoding="utf-8") as f:
         return {k.lower(): v for k, v in json.load(f).items()}
 
-def parse_insert_statements(file_path):
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if line.upper().startswith("INSERT INTO"):
-                yield line.strip()
-
-def extract_inserts(stmt):
-    """Extract VALUES tuples using sqlparse, safe for huge blobs."""
-    try:
-        values_blob = stmt.split("VALUES", 1)[1].rsplit(";", 1)[0]
-        parsed = sqlparse.parse("INSERT INTO dummy VALUES " + values_blob + ";")[0]
-        tokens = parsed.tokens[-2].tokens if hasattr(parsed.tokens[-2], 'tokens') else []
-        raw_rows = [str(token) for token in tokens if token.ttype is None and str(token).startswith("(")]
-        return raw_rows
-    except Exception as e:
-        logging.error(f"Failed to extract inserts: {e}")
-        return []
-
-def robust_split_row(values_str):
-    """Split SQL VALUES clause using csv reader logic to handle commas/quotes."""
-    cleaned_str = values_str.strip().strip('()')
-    cleaned_str = re.sub(r"''", "§§QUOTE§§", cleaned_str)
-    cleaned_str = re.sub(r"'([^']*)'", r'"\1"', cleaned_str)
-    cleaned_str = cleaned_str.replace("§§QUOTE§§", "'")
-    try:
-        return next(csv.reader(io.StringIO(cleaned_str), skipinitialspace=True))
-    except Exception as e:
-        logging.warning(f"Failed to split row: {e}")
-        return []
-
-def clean_and_cast_values(values_str, col_types):
-    raw_values = robust_split_row(values_str)
-    cleaned = []
-    for val, typ in zip(raw_values, col_types):
-        val = val.strip()
-        try:
-            if val.upper() == "NULL":
-                cleaned.append(None)
-            elif typ.lower() == "boolean":
-                cleaned.append(val.lower() in ("1", "true", "t"))
-            elif typ.lower() in ("integer", "bigint", "smallint"):
-                cleaned.append(int(val))
-            elif typ.lower() in ("real", "float", "decimal", "double precision"):
-                cleaned.append(float(val))
-            elif typ.lower() == "json" and val.startswith("{"):
-                cleaned.append(json.loads(val.replace("'", '"')))
-            else:
-                cleaned.append(val)
-        except Exception as e:
-            logging.warning(f"Type coercion failed for value '{val}' as {typ}: {e}")
-            cleaned.append(None)
-    return cleaned
-
 def insert_data_into_postgres(table, columns, values, pg_types, cursor):
     cols = ', '.join(f'"{c}"' for c in columns)
     sql = f'INSERT INTO accelo_tap."{table}" ({cols}) VALUES %s'
@@ -88,71 +44,253 @@ def insert_data_into_postgres(table, columns, values, pg_types, cursor):
         logging.error(f"Insert failed for {table}: {e}")
         return False
 
-# --- MAIN ---
-def main():
-    mysql_schema = load_schema(MYSQL_SCHEMA_PATH)
-    pg_schema = load_schema(PG_SCHEMA_PATH)
-    conn = get_pg_connection()
+def iter_column_groups(table, file_path, col_defs, start=0, end=None):
+    """Yield (insert_columns, insert_types, rows) for each run of INSERTs sharing one column list."""
+    for insert_columns, group in groupby(iter_dump_rows(file_path, start, end), key=itemgetter(1)):
+        if insert_columns is None:
+            continue
+        insert_types, codec = get_row_codec(table, insert_columns, col_defs)
+        yield insert_columns, insert_types, (codec(row) for _, _, row in group)
+
+def import_table(table, file_path, col_defs, cursor, loader="copy", start=0, end=None):
+    """Load one table's dump file (or its [start, end) byte range) into accelo_tap; returns rows written."""
+    if loader == "delta":
+        counts = delta_sync_table(table, file_path, col_defs, cursor)
+        return counts["inserted"] + counts["updated"]
+
+    inserted = 0
+    for insert_columns, insert_types, rows in iter_column_groups(table, file_path, col_defs, start, end):
+        if loader == "copy":
+            def fallback(tbl, columns, values):
+                return insert_data_into_postgres(tbl, columns, values, insert_types, cursor)
+            inserted += copy_rows_into_postgres(table, insert_columns, rows, cursor, fallback)
+            continue
+
+        all_rows = []
+        for row in rows:
+            all_rows.append(row)
+            if len(all_rows) >= INSERT_BATCH_ROWS:
+                if insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor):
+                    inserted += len(all_rows)
+                all_rows = []
+        if all_rows and insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor):
+            inserted += len(all_rows)
+    return inserted
+
+def run_table_import(table, file_path, col_defs, conn, loader, start=0, end=None, swap=False):
+    """Import and commit one table, or one chunk of it, on `conn`; returns a result summary.
+
+    With `swap`, the whole table is loaded into an UNLOGGED staging copy that replaces
+    the live table only once it is complete (see staging_swap.py).
+    """
+    started = time.perf_counter()
     cursor = conn.cursor()
+    inserted = 0
+    ok = True
+    try:
+        if swap:
+            def load(staging, staging_cursor):
+                return import_table(staging, file_path, col_defs, staging_cursor, loader)
+            inserted = load_with_swap(conn, table, load)
+        else:
+            inserted = import_table(table, file_path, col_defs, cursor, loader, start, end)
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error while processing table {table}: {e}")
+        ok = False
+    finally:
+        cursor.close()
+    seconds = time.perf_counter() - started
+    part = "" if end is None else f" bytes {start}-{end}"
+    logging.info(f"Finished table: {table}{part} ({inserted} rows in {seconds:.1f}s)")
+    return {"table": table, "inserted": inserted, "ok": ok, "seconds": seconds}
 
-    total_inserted = 0
-    failed_tables = []
+# --- WORKERS ---
+_worker_conn = None
 
-    sql_files = [f for f in os.listdir(SQL_DUMP_DIR) if f.endswith(".sql")]
+def _init_worker():
+    """Give each pool process its own connection, so N workers never hold more than N."""
+    global _worker_conn
+    _worker_conn = get_pg_connection(PG_BULK_SETUP)
 
-    for filename in tqdm(sql_files, desc="Importing SQL files"):
+def _worker_import(table, file_path, col_defs, loader, start, end, swap):
+    return run_table_import(table, file_path, col_defs, _worker_conn, loader, start, end, swap)
+
+def collect_tasks(mysql_schema, pg_schema):
+    """List (table, file_path, col_defs) for every known table, largest dump file first."""
+    tasks = []
+    for filename in os.listdir(SQL_DUMP_DIR):
+        if not filename.endswith(".sql"):
+            continue
         table = filename.replace(".sql", "").lower()
         if table not in mysql_schema or table not in pg_schema:
             logging.warning(f"Skipping unknown or mismatched table: {table}")
             continue
+        tasks.append((table, os.path.join(SQL_DUMP_DIR, filename), pg_schema[table]))
+    tasks.sort(key=lambda t: os.path.getsize(t[1]), reverse=True)
+    return tasks
 
-        logging.info(f"Processing table: {table}")
-        col_defs = pg_schema[table]
+def import_serial(tasks, loader, swap=False):
+    conn = get_pg_connection(PG_BULK_SETUP)
+    results = []
+    try:
+        for table, file_path, col_defs in tqdm(tasks, desc="Importing SQL files"):
+            logging.info(f"Processing table: {table}")
+            results.append(run_table_import(table, file_path, col_defs, conn, loader, swap=swap))
+    finally:
+        conn.close()
+    return results
 
-        all_rows = []
+def split_tasks(tasks, chunk_bytes):
+    """Expand tasks into (table, file_path, col_defs, start, end) work units, biggest first.
 
-        try:
-            for stmt in parse_insert_statements(os.path.join(SQL_DUMP_DIR, filename)):
-                match = re.match(r"INSERT INTO [`\"]?(\w+)[`\"]? \((.*?)\) VALUES", stmt, re.IGNORECASE)
-                if not match:
-                    continue
+    Files above chunk_bytes are cut on INSERT boundaries so one huge table is parsed
+    by several workers at once; each chunk commits on its own.
+    """
+    units = []
+    for table, file_path, col_defs in tasks:
+        size = os.path.getsize(file_path)
+        if chunk_bytes and size > chunk_bytes:
+            ranges = split_insert_ranges(file_path, chunk_bytes)
+            logging.info(f"Split {table} into {len(ranges)} chunks")
+        else:
+            ranges = [(0, None)]
+        for start, end in ranges:
+            units.append((table, file_path, col_defs, start, end))
+    units.sort(key=lambda u: (u[4] if u[4] is not None else os.path.getsize(u[1])) - u[3], reverse=True)
+    return units
 
-                col_str = match.group(2)
-                insert_columns = [c.strip(' `"') for c in col_str.split(",")]
+def merge_results(results):
+    """Fold per-chunk results into one entry per table (seconds summed across chunks).
 
-                insert_types = []
-                for col in insert_columns:
-                    col_def = next((c for c in col_defs if c["name"] == col), None)
-                    insert_types.append(col_def["type"] if col_def else "text")
+    A table is "partial" when some of its chunks committed and others failed.
+    """
+    merged = {}
+    committed = {}
+    for r in results:
+        m = merged.setdefault(r["table"], {"table": r["table"], "inserted": 0, "ok": True, "seconds": 0.0})
+        m["inserted"] += r["inserted"]
+        m["ok"] = m["ok"] and r["ok"]
+        m["seconds"] += r["seconds"]
+        committed[r["table"]] = committed.get(r["table"], False) or r["ok"]
+    for m in merged.values():
+        m["partial"] = not m["ok"] and committed[m["table"]]
+    return list(merged.values())
 
-                row_texts = extract_inserts(stmt)
-                for row_text in row_texts:
-                    row = clean_and_cast_values(row_text, insert_types)
-                    all_rows.append(row)
+def truncate_tables(tables):
+    """Empty tables a failed chunked load left half-filled, so reloading them does not append duplicates."""
+    conn = get_pg_connection(PG_BULK_SETUP)
+    cursor = conn.cursor()
+    try:
+        for table in tables:
+            logging.info(f"Truncating partly loaded table before reload: {table}")
+            cursor.execute(f'TRUNCATE accelo_tap."{table}"')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
 
-                if len(all_rows) >= 500:
-                    success = insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor)
-                    if success:
-                        total_inserted += len(all_rows)
-                    all_rows.clear()
+def import_parallel(tasks, loader, workers, chunk_bytes=0, swap=False):
+    results = []
+    units = split_tasks(tasks, chunk_bytes)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(_worker_import, table, file_path, col_defs, loader, start, end, swap): table
+                   for table, file_path, col_defs, start, end in units}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Importing SQL files"):
+            table = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.error(f"Worker failed on table {table}: {e}")
+                results.append({"table": table, "inserted": 0, "ok": False, "seconds": 0.0})
+    return merge_results(results)
 
-        except Exception as e:
-            logging.error(f"Error while processing table {table}: {e}")
-            failed_tables.append(table)
+def skip_unchanged_tasks(tasks, store):
+    """Drop tasks whose dump file matches the fingerprint of the last successful load.
 
-        if all_rows:
-            success = insert_data_into_postgres(table, insert_columns, all_rows, insert_types, cursor)
-            if success:
-                total_inserted += len(all_rows)
+    Returns (remaining_tasks, fingerprints) where fingerprints maps table -> new hash.
+    """
+    remaining = []
+    fingerprints = {}
+    for task in tasks:
+        table, file_path = task[0], task[1]
+        fingerprint = fingerprint_file(file_path)
+        if store.is_unchanged(table, fingerprint):
+            logging.info(f"Unchanged since last load, skipping: {table}")
+            continue
+        fingerprints[table] = fingerprint
+        remaining.append(task)
+    return remaining, fingerprints
 
-        conn.commit()
-        logging.info(f"Finished table: {table}")
+# --- MAIN ---
+def main():
+    parser = argparse.ArgumentParser(description="Import Accelo SQL dump files into accelo_tap.")
+    parser.add_argument("--loader", choices=LOADERS, default="copy",
+                        help="'copy' streams rows over COPY FROM STDIN, 'insert' uses execute_values batches, "
+                             "'delta' upserts/deletes only rows that changed since the last run (by primary key)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (one PostgreSQL connection each)")
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_MB,
+                        help="With --workers, split dump files larger than this many MB across workers (0 disables)")
+    parser.add_argument("--full", action="store_true",
+                        help="Reload every table, ignoring fingerprints of previous loads")
+    parser.add_argument("--swap", action="store_true",
+                        help="Load each table into an UNLOGGED staging copy and swap it in when complete "
+                             "(set SWAP_UNLOGGED=1 to keep it UNLOGGED; the table is then reloaded every run)")
+    args = parser.parse_args()
+    if args.swap and args.loader == "delta":
+        parser.error("--swap reloads whole tables and cannot be combined with --loader delta")
+
+    mysql_schema = load_schema(MYSQL_SCHEMA_PATH)
+    pg_schema = load_schema(PG_SCHEMA_PATH)
+    tasks = collect_tasks(mysql_schema, pg_schema)
+
+    store = FingerprintStore("accelo_tap")
+    if args.full:
+        fingerprints = {table: fingerprint_file(file_path) for table, file_path, _ in tasks}
+    else:
+        total = len(tasks)
+        tasks, fingerprints = skip_unchanged_tasks(tasks, store)
+        logging.info(f"{total - len(tasks)} of {total} tables unchanged since last load")
 
-    cursor.close()
-    conn.close()
+    # Delta upserts by primary key and swaps replace the whole table, so only the
+    # appending loaders need a half-loaded table emptied first.
+    partial = [t[0] for t in tasks if store.is_partial(t[0])]
+    if partial and not args.swap and args.loader != "delta":
+        truncate_tables(partial)
+
+    started = time.perf_counter()
+    if args.workers > 1:
+        # Delta syncs must see every row of a table to find deletions, and swaps replace
+        # the table in one step, so neither is split into chunks.
+        chunk_bytes = 0 if args.loader == "delta" or args.swap else args.chunk_mb * 1024 * 1024
+        results = import_parallel(tasks, args.loader, args.workers, chunk_bytes, args.swap)
+    else:
+        results = import_serial(tasks, args.loader, args.swap)
+
+    total_inserted = sum(r["inserted"] for r in results)
+    failed_tables = [r["table"] for r in results if not r["ok"]]
+    timings = {r["table"]: r["seconds"] for r in results}
+
+    for r in results:
+        if not r["ok"]:
+            if r.get("partial"):
+                store.mark_partial(r["table"])   # committed chunks stay in place; truncated before the next load
+            continue
+        if args.swap and not SET_LOGGED:
+            store.forget(r["table"])   # UNLOGGED tables come back empty after a crash; reload next run
+        else:
+            store.record(r["table"], fingerprints[r["table"]])
+    store.close()
 
-    logging.info("Import Complete")
+    logging.info(f"Import Complete in {time.perf_counter() - started:.1f}s")
     logging.info(f"Total rows inserted: {total_inserted}")
+    for table, seconds in sorted(timings.items(), key=lambda t: t[1], reverse=True)[:10]:
+        logging.info(f"  {table}: {seconds:.1f}s")
     if failed_tables:
         logging.warning(f"Tables with errors: {set(failed_tables)}")
 
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import threading
+
+# --- CONFIG ---
+TOKEN_CACHE_PATH = os.getenv(
+    "TOKEN_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".token_cache.json")
+)
+REFRESH_MARGIN = 300  # refresh this many seconds before the token expires
+
+_file_lock = threading.Lock()
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+# --- DISK CACHE ---
+def read_cache(path=TOKEN_CACHE_PATH):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache_entry(name, entry, path=TOKEN_CACHE_PATH):
+    """Merge one entry into the cache file; written atomically and readable by the owner only."""
+    with _file_lock:
+        cache = read_cache(path)
+        cache[name] = entry
+        now = time.time()
+        cache = {k: v for k, v in cache.items() if v.get("expires_at", 0) > now}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp, path)
+
+
+# --- MANAGER ---
+class TokenManager:
+    """Caches one access token in memory and on disk and refreshes it shortly before expiry.
+
+    `fetch()` returns (access_token, expires_in_seconds). Concurrent callers that find
+    the token stale wait on a single refresh instead of each requesting a new one.
+    """
+
+    def __init__(self, name, fetch, cache_path=TOKEN_CACHE_PATH, margin=REFRESH_MARGIN):
+        self.name = name
+        self.fetch = fetch
+        self.cache_path = cache_path
+        self.margin = margin
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def _usable(self, entry):
+        return entry is not None and entry.get("expires_at", 0) - self.margin > time.time()
+
+    def get(self, force_refresh=False):
+        entry = self._entry
+        if not force_refresh and self._usable(entry):
+            return entry["access_token"]
+
+        with self._lock:
+            stale = entry["access_token"] if force_refresh and entry else None
+            entry = self._entry
+            if self._usable(entry) and entry["access_token"] != stale:
+                return entry["access_token"]  # another thread refreshed while we waited
+            if not force_refresh:
+                entry = read_cache(self.cache_path).get(self.name)
+                if self._usable(entry):
+                    self._entry = entry
+                    return entry["access_token"]
+
+            token, expires_in = self.fetch()
+            entry = {"access_token": token, "expires_at": time.time() + int(expires_in)}
+            self._entry = entry
+            try:
+                write_cache_entry(self.name, entry, self.cache_path)
+            except OSError:
+                pass  # the disk cache only saves a round trip next run
+            return token
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+
+def get_manager(name, fetch):
+    """Process-wide TokenManager for `name`, created on first use."""
+    with _managers_lock:
+        manager = _managers.get(name)
+        if manager is None:
+            manager = _managers[name] = TokenManager(name, fetch)
+        return manager